@@ -4,14 +4,22 @@ Detoxification SNP Analysis Script
 Analyzes detoxification-related genetic markers from 23andMe data
 """
 
+import hashlib
 import os
+import pickle
+import sys
+import tempfile
 from collections import defaultdict
 from datetime import datetime
+from functools import lru_cache
+from typing import NamedTuple, Optional
 
 # Paths
 BASE_PATH = "/Users/sh/Library/Mobile Documents/com~apple~CloudDocs/dna"
 GENOME_FILE = f"{BASE_PATH}/data/genome_Andre_Sh_v5_Full_20260106100611.txt"
 REPORTS_PATH = f"{BASE_PATH}/reports"
+CACHE_PATH = f"{BASE_PATH}/cache"
+GENOME_CACHE_VERSION = 2  # bump when the parse_genome() layout changes
 
 # =============================================================================
 # SNP DATABASE - Organized by detoxification category
@@ -331,67 +339,101 @@ DETOX_SNPS = {
 
 
 def load_genome():
-    """Load genome data into a dictionary"""
+    """Load genome data, reusing the parsed copy cached by a previous run"""
+    cache_file = f"{CACHE_PATH}/genome_v{GENOME_CACHE_VERSION}_{genome_digest()}.pickle"
+    try:
+        with open(cache_file, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+        pass  # no cache yet, or a damaged one: re-parse and rewrite it
+
+    genome = parse_genome()
+    os.makedirs(CACHE_PATH, exist_ok=True)
+    # Unique temp file, so scripts sharing this cache never write into the same one
+    fd, tmp_file = tempfile.mkstemp(dir=CACHE_PATH, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(genome, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    return genome
+
+
+def genome_digest():
+    """SHA-256 of the genome file contents, used as the cache key"""
+    # hashlib uses OpenSSL, which picks SHA-NI instructions when the CPU has them
+    digest = hashlib.sha256()
+    with open(GENOME_FILE, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def parse_genome():
+    """Parse the raw genome file into {rsid: (genotype, chromosome, position)}"""
     genome = {}
+    intern = sys.intern  # ~20 distinct genotypes/chromosomes shared by every row
     with open(GENOME_FILE, 'r') as f:
         for line in f:
             if line.startswith('#'):
                 continue
             parts = line.strip().split('\t')
             if len(parts) >= 4:
-                rsid, chrom, pos, genotype = parts[0], parts[1], parts[2], parts[3]
-                genome[rsid] = {
-                    'chromosome': chrom,
-                    'position': pos,
-                    'genotype': genotype
-                }
+                genome[parts[0]] = (intern(parts[3]), intern(parts[1]), parts[2])
     return genome
 
 
-def normalize_genotype(genotype):
-    """Normalize genotype for comparison (sort alleles)"""
-    if len(genotype) == 2:
-        return ''.join(sorted(genotype))
-    return genotype
+def _expand_interpretation(interpretations):
+    """Add the reversed allele order for every 2-letter genotype key"""
+    table = dict(interpretations)
+    for gt, value in interpretations.items():
+        if len(gt) == 2:
+            table.setdefault(gt[::-1], value)
+    return table
+
+
+class SNPResult(NamedTuple):
+    """Outcome of looking up one SNP in the genome"""
+    snp_id: str
+    gene: str
+    description: str
+    risk_allele: str
+    found: bool = False
+    genotype: Optional[str] = None
+    risk_level: Optional[str] = None
+    interpretation: Optional[str] = None
+    chromosome: Optional[str] = None
+    position: Optional[str] = None
+
+
+# (category, name, snp_ids, snp_infos) per category, flattened once at import
+DETOX_FLAT = tuple(
+    (category, cat_info['name'], tuple(cat_info['snps']), tuple(cat_info['snps'].values()))
+    for category, cat_info in DETOX_SNPS.items()
+)
+
+# snp_id -> genotype -> (risk_level, interpretation), both allele orders
+RISK_LUT = {
+    snp_id: _expand_interpretation(snp_info.get('interpretation', {}))
+    for cat_info in DETOX_SNPS.values()
+    for snp_id, snp_info in cat_info['snps'].items()
+}
 
 
 def analyze_snp(snp_id, snp_info, genome_data):
     """Analyze a single SNP"""
-    result = {
-        'snp_id': snp_id,
-        'gene': snp_info['gene'],
-        'description': snp_info['description'],
-        'risk_allele': snp_info['risk_allele'],
-        'found': False,
-        'genotype': None,
-        'risk_level': None,
-        'interpretation': None
-    }
-
-    if snp_id in genome_data:
-        result['found'] = True
-        raw_genotype = genome_data[snp_id]['genotype']
-        result['genotype'] = raw_genotype
-        result['chromosome'] = genome_data[snp_id]['chromosome']
-        result['position'] = genome_data[snp_id]['position']
-
-        # Try to find interpretation
-        normalized = normalize_genotype(raw_genotype)
-        interpretations = snp_info.get('interpretation', {})
+    entry = genome_data.get(snp_id)
+    if entry is None:
+        return SNPResult(snp_id, snp_info['gene'], snp_info['description'], snp_info['risk_allele'])
 
-        # Try both original and normalized genotype
-        for gt in [raw_genotype, normalized]:
-            if gt in interpretations:
-                result['risk_level'], result['interpretation'] = interpretations[gt]
-                break
-
-        # If still not found, try reverse
-        if result['interpretation'] is None and len(raw_genotype) == 2:
-            reversed_gt = raw_genotype[::-1]
-            if reversed_gt in interpretations:
-                result['risk_level'], result['interpretation'] = interpretations[reversed_gt]
-
-    return result
+    genotype, chromosome, position = entry
+    risk_level, interpretation = RISK_LUT[snp_id].get(genotype, (None, None))
+    return SNPResult(
+        snp_id, snp_info['gene'], snp_info['description'], snp_info['risk_allele'],
+        True, genotype, risk_level, interpretation, chromosome, position,
+    )
 
 
 def determine_mthfr_status(results):
@@ -400,10 +442,10 @@ def determine_mthfr_status(results):
     a1298c = None
 
     for r in results:
-        if r['snp_id'] == 'rs1801133':
-            c677t = r['genotype']
-        elif r['snp_id'] == 'rs1801131':
-            a1298c = r['genotype']
+        if r.snp_id == 'rs1801133':
+            c677t = r.genotype
+        elif r.snp_id == 'rs1801131':
+            a1298c = r.genotype
 
     if not c677t or not a1298c:
         return None
@@ -454,23 +496,23 @@ def determine_nat2_status(results):
     rs1799930 = None
 
     for r in results:
-        if r['snp_id'] == 'rs1801280':
+        if r.snp_id == 'rs1801280':
             rs1801280 = r
-        elif r['snp_id'] == 'rs1799930':
+        elif r.snp_id == 'rs1799930':
             rs1799930 = r
 
     if not rs1801280 or not rs1799930:
         return None
 
     slow_count = 0
-    if rs1801280['risk_level'] == 'slow':
+    if rs1801280.risk_level == 'slow':
         slow_count += 2
-    elif rs1801280['risk_level'] == 'intermediate':
+    elif rs1801280.risk_level == 'intermediate':
         slow_count += 1
 
-    if rs1799930['risk_level'] == 'slow':
+    if rs1799930.risk_level == 'slow':
         slow_count += 2
-    elif rs1799930['risk_level'] == 'intermediate':
+    elif rs1799930.risk_level == 'intermediate':
         slow_count += 1
 
     if slow_count >= 3:
@@ -481,8 +523,8 @@ def determine_nat2_status(results):
         status = ('fast', 'Быстрый ацетилятор')
 
     return {
-        'rs1801280': rs1801280['genotype'] if rs1801280['found'] else 'н/д',
-        'rs1799930': rs1799930['genotype'] if rs1799930['found'] else 'н/д',
+        'rs1801280': rs1801280.genotype if rs1801280.found else 'н/д',
+        'rs1799930': rs1799930.genotype if rs1799930.found else 'н/д',
         'status': status[0],
         'interpretation': status[1]
     }
@@ -494,38 +536,43 @@ def determine_cyp2c19_status(results):
     rs12248560 = None  # *17
 
     for r in results:
-        if r['snp_id'] == 'rs4244285':
+        if r.snp_id == 'rs4244285':
             rs4244285 = r
-        elif r['snp_id'] == 'rs12248560':
+        elif r.snp_id == 'rs12248560':
             rs12248560 = r
 
     if not rs4244285 or not rs12248560:
         return None
 
-    is_slow = rs4244285['risk_level'] == 'slow'
-    is_intermediate_slow = rs4244285['risk_level'] == 'intermediate'
-    is_ultrafast = rs12248560['risk_level'] == 'ultrafast'
-    is_fast = rs12248560['risk_level'] == 'fast'
+    status = _cyp2c19_call(rs4244285.risk_level, rs12248560.risk_level)
+
+    return {
+        'rs4244285': rs4244285.genotype if rs4244285.found else 'н/д',
+        'rs12248560': rs12248560.genotype if rs12248560.found else 'н/д',
+        'status': status[0],
+        'interpretation': status[1]
+    }
+
+
+@lru_cache(maxsize=None)
+def _cyp2c19_call(star2_level, star17_level):
+    """Map CYP2C19 *2/*17 risk levels to (status, interpretation)"""
+    is_slow = star2_level == 'slow'
+    is_intermediate_slow = star2_level == 'intermediate'
+    is_ultrafast = star17_level == 'ultrafast'
+    is_fast = star17_level == 'fast'
 
     if is_slow:
-        status = ('poor', 'Плохой метаболизатор CYP2C19 - клопидогрел неэффективен!')
+        return ('poor', 'Плохой метаболизатор CYP2C19 - клопидогрел неэффективен!')
     elif is_intermediate_slow and is_ultrafast:
-        status = ('normal', 'Нормальный метаболизатор (компенсация)')
+        return ('normal', 'Нормальный метаболизатор (компенсация)')
     elif is_intermediate_slow:
-        status = ('intermediate', 'Промежуточный метаболизатор CYP2C19')
+        return ('intermediate', 'Промежуточный метаболизатор CYP2C19')
     elif is_ultrafast:
-        status = ('ultrarapid', 'Ультрабыстрый метаболизатор CYP2C19 - может потребоваться увеличение дозы')
+        return ('ultrarapid', 'Ультрабыстрый метаболизатор CYP2C19 - может потребоваться увеличение дозы')
     elif is_fast:
-        status = ('rapid', 'Быстрый метаболизатор CYP2C19')
-    else:
-        status = ('normal', 'Нормальный метаболизатор CYP2C19')
-
-    return {
-        'rs4244285': rs4244285['genotype'] if rs4244285['found'] else 'н/д',
-        'rs12248560': rs12248560['genotype'] if rs12248560['found'] else 'н/д',
-        'status': status[0],
-        'interpretation': status[1]
-    }
+        return ('rapid', 'Быстрый метаболизатор CYP2C19')
+    return ('normal', 'Нормальный метаболизатор CYP2C19')
 
 
 def determine_alcohol_tolerance(results):
@@ -534,35 +581,41 @@ def determine_alcohol_tolerance(results):
     aldh2 = None
 
     for r in results:
-        if r['snp_id'] == 'rs1229984':
+        if r.snp_id == 'rs1229984':
             adh1b = r
-        elif r['snp_id'] == 'rs671':
+        elif r.snp_id == 'rs671':
             aldh2 = r
 
     if not adh1b and not aldh2:
         return None
 
-    adh_fast = adh1b and adh1b['risk_level'] in ['fast', 'ultrafast'] if adh1b else False
-    aldh_low = aldh2 and aldh2['risk_level'] in ['low', 'very_low'] if aldh2 else False
-
-    if aldh_low:
-        status = ('intolerant', 'Непереносимость алкоголя - флашинг, тошнота')
-    elif adh_fast and not aldh_low:
-        status = ('sensitive', 'Быстрое опьянение, но хорошее расщепление ацетальдегида')
-    elif not adh_fast and not aldh_low:
-        status = ('normal', 'Стандартная переносимость алкоголя')
-    else:
-        status = ('unknown', 'Не удалось определить')
+    status = _alcohol_call(adh1b.risk_level if adh1b else None,
+                           aldh2.risk_level if aldh2 else None)
 
     return {
-        'adh1b': adh1b['genotype'] if adh1b and adh1b['found'] else 'н/д',
-        'aldh2': aldh2['genotype'] if aldh2 and aldh2['found'] else 'н/д',
+        'adh1b': adh1b.genotype if adh1b and adh1b.found else 'н/д',
+        'aldh2': aldh2.genotype if aldh2 and aldh2.found else 'н/д',
         'status': status[0],
         'interpretation': status[1]
     }
 
 
-def generate_category_report(category, results, genome):
+@lru_cache(maxsize=None)
+def _alcohol_call(adh1b_level, aldh2_level):
+    """Map ADH1B/ALDH2 risk levels to (status, interpretation)"""
+    adh_fast = adh1b_level in ['fast', 'ultrafast']
+    aldh_low = aldh2_level in ['low', 'very_low']
+
+    if aldh_low:
+        return ('intolerant', 'Непереносимость алкоголя - флашинг, тошнота')
+    elif adh_fast and not aldh_low:
+        return ('sensitive', 'Быстрое опьянение, но хорошее расщепление ацетальдегида')
+    elif not adh_fast and not aldh_low:
+        return ('normal', 'Стандартная переносимость алкоголя')
+    return ('unknown', 'Не удалось определить')
+
+
+def generate_category_report(category, results):
     """Generate report for a category"""
     cat_info = DETOX_SNPS[category]
 
@@ -572,14 +625,14 @@ def generate_category_report(category, results, genome):
     report.append("\n## Результаты\n")
 
     # Statistics
-    found = sum(1 for r in results if r['found'])
+    found = sum(r.found for r in results)
     report.append(f"Найдено маркеров: {found}/{len(results)}\n")
 
     # Risk summary
     risk_counts = defaultdict(int)
     for r in results:
-        if r['risk_level']:
-            risk_counts[r['risk_level']] += 1
+        if r.risk_level:
+            risk_counts[r.risk_level] += 1
 
     if risk_counts:
         report.append("### Сводка по статусам\n")
@@ -605,12 +658,12 @@ def generate_category_report(category, results, genome):
     report.append("|-----|-----|---------|--------|---------------|")
 
     for r in results:
-        if r['found']:
-            risk_label = r['risk_level'] or 'н/д'
-            interp = r['interpretation'] or 'Нет данных'
-            report.append(f"| {r['snp_id']} | {r['gene']} | **{r['genotype']}** | {risk_label} | {interp} |")
+        if r.found:
+            risk_label = r.risk_level or 'н/д'
+            interp = r.interpretation or 'Нет данных'
+            report.append(f"| {r.snp_id} | {r.gene} | **{r.genotype}** | {risk_label} | {interp} |")
         else:
-            report.append(f"| {r['snp_id']} | {r['gene']} | - | - | Не найден в геноме |")
+            report.append(f"| {r.snp_id} | {r.gene} | - | - | Не найден в геноме |")
 
     # Special sections
     if category == 'methylation':
@@ -652,7 +705,7 @@ def generate_category_report(category, results, genome):
     return '\n'.join(report)
 
 
-def generate_summary_report(all_results, genome):
+def generate_summary_report(all_results, genome, by_rsid):
     """Generate overall summary report"""
     report = []
     report.append("# Сводный отчёт по детоксикации")
@@ -674,11 +727,11 @@ def generate_summary_report(all_results, genome):
 
     for category, results in all_results.items():
         for r in results:
-            if r['risk_level'] in ['slow', 'low', 'very_low', 'high']:
+            if r.risk_level in ['slow', 'low', 'very_low', 'high']:
                 critical.append((category, r))
-            elif r['risk_level'] in ['moderate', 'intermediate']:
+            elif r.risk_level in ['moderate', 'intermediate']:
                 attention.append((category, r))
-            elif r['risk_level'] in ['normal', 'fast', 'high'] and r['risk_level'] == 'normal':
+            elif r.risk_level in ['normal', 'fast', 'high'] and r.risk_level == 'normal':
                 optimal.append((category, r))
 
     if critical:
@@ -687,7 +740,7 @@ def generate_summary_report(all_results, genome):
         report.append("|-----------|-----|-----|---------|----------|")
         for cat, r in critical:
             cat_name = DETOX_SNPS[cat]['name']
-            report.append(f"| {cat_name} | {r['snp_id']} | {r['gene']} | **{r['genotype']}** | {r['interpretation']} |")
+            report.append(f"| {cat_name} | {r.snp_id} | {r.gene} | **{r.genotype}** | {r.interpretation} |")
         report.append("")
 
     if attention:
@@ -696,7 +749,7 @@ def generate_summary_report(all_results, genome):
         report.append("|-----------|-----|-----|---------|----------|")
         for cat, r in attention:
             cat_name = DETOX_SNPS[cat]['name']
-            report.append(f"| {cat_name} | {r['snp_id']} | {r['gene']} | **{r['genotype']}** | {r['interpretation']} |")
+            report.append(f"| {cat_name} | {r.snp_id} | {r.gene} | **{r.genotype}** | {r.interpretation} |")
         report.append("")
 
     # Special analyses
@@ -704,7 +757,7 @@ def generate_summary_report(all_results, genome):
     report.append("## Специальные анализы\n")
 
     # MTHFR
-    methylation_results = all_results.get('methylation', [])
+    methylation_results = all_results['methylation']
     mthfr = determine_mthfr_status(methylation_results)
     if mthfr:
         report.append("### MTHFR (Метилирование)\n")
@@ -717,7 +770,7 @@ def generate_summary_report(all_results, genome):
             report.append("")
 
     # NAT2
-    phase2_results = all_results.get('phase2_conjugation', [])
+    phase2_results = all_results['phase2_conjugation']
     nat2 = determine_nat2_status(phase2_results)
     if nat2:
         report.append("### NAT2 (Ацетилирование)\n")
@@ -729,7 +782,7 @@ def generate_summary_report(all_results, genome):
             report.append("")
 
     # CYP2C19
-    phase1_results = all_results.get('phase1_cyp450', [])
+    phase1_results = all_results['phase1_cyp450']
     cyp2c19 = determine_cyp2c19_status(phase1_results)
     if cyp2c19:
         report.append("### CYP2C19 (Метаболизм лекарств)\n")
@@ -741,7 +794,7 @@ def generate_summary_report(all_results, genome):
             report.append("")
 
     # Alcohol
-    alcohol_results = all_results.get('alcohol', [])
+    alcohol_results = all_results['alcohol']
     alcohol = determine_alcohol_tolerance(alcohol_results)
     if alcohol:
         report.append("### Алкоголь\n")
@@ -749,26 +802,21 @@ def generate_summary_report(all_results, genome):
         report.append(f"- {alcohol['interpretation']}\n")
 
     # SLCO1B1 Statin warning
-    transporter_results = all_results.get('transporters', [])
-    for r in transporter_results:
-        if r['snp_id'] == 'rs4149056' and r['found']:
-            if r['risk_level'] in ['moderate', 'high']:
-                report.append("### SLCO1B1 (Статины)\n")
-                report.append(f"- Генотип: {r['genotype']}")
-                report.append(f"- **{r['interpretation']}**")
-                if r['risk_level'] == 'high':
-                    report.append("- **ВАЖНО:** Избегать высоких доз симвастатина, аторвастатина!\n")
-                else:
-                    report.append("")
+    r = by_rsid.get('rs4149056')
+    if r and r.found and r.risk_level in ['moderate', 'high']:
+        report.append("### SLCO1B1 (Статины)\n")
+        report.append(f"- Генотип: {r.genotype}")
+        report.append(f"- **{r.interpretation}**")
+        if r.risk_level == 'high':
+            report.append("- **ВАЖНО:** Избегать высоких доз симвастатина, аторвастатина!\n")
+        else:
+            report.append("")
 
     report.append("---\n")
     report.append("## Статистика анализа\n")
 
-    total_snps = 0
-    found_snps = 0
-    for cat, results in all_results.items():
-        total_snps += len(results)
-        found_snps += sum(1 for r in results if r['found'])
+    total_snps = sum(len(results) for results in all_results.values())
+    found_snps = sum(r.found for results in all_results.values() for r in results)
 
     report.append(f"- Всего проанализировано SNP: {total_snps}")
     report.append(f"- Найдено в геноме: {found_snps}")
@@ -787,32 +835,35 @@ def main():
     print(f"      Загружено {len(genome)} SNP")
 
     print("\n[2/4] Анализ маркеров по категориям...")
-    all_results = {}
+    all_results = defaultdict(list)
 
-    for category, cat_info in DETOX_SNPS.items():
-        print(f"      -> {cat_info['name']}...")
+    for category, name, snp_ids, snp_infos in DETOX_FLAT:
+        print(f"      -> {name}...")
         results = []
-        for snp_id, snp_info in cat_info['snps'].items():
+        for snp_id, snp_info in zip(snp_ids, snp_infos):
             result = analyze_snp(snp_id, snp_info, genome)
             results.append(result)
         all_results[category] = results
 
         # Count found
-        found = sum(1 for r in results if r['found'])
+        found = sum(r.found for r in results)
         print(f"        Найдено: {found}/{len(results)}")
 
+    # rsid -> result index shared by the summary lookups
+    by_rsid = {r.snp_id: r for results in all_results.values() for r in results}
+
     print("\n[3/4] Генерация отчётов по категориям...")
+    report_dir = f"{REPORTS_PATH}/detox"
+    os.makedirs(report_dir, exist_ok=True)
     for category, results in all_results.items():
-        report = generate_category_report(category, results, genome)
-        report_dir = f"{REPORTS_PATH}/detox"
-        os.makedirs(report_dir, exist_ok=True)
+        report = generate_category_report(category, results)
         report_path = f"{report_dir}/{category}.md"
         with open(report_path, 'w', encoding='utf-8') as f:
             f.write(report)
         print(f"      -> {report_path}")
 
     print("\n[4/4] Генерация сводного отчёта...")
-    summary = generate_summary_report(all_results, genome)
+    summary = generate_summary_report(all_results, genome, by_rsid)
     summary_path = f"{REPORTS_PATH}/detox/report.md"
     with open(summary_path, 'w', encoding='utf-8') as f:
         f.write(summary)
@@ -826,11 +877,11 @@ def main():
     print("\nКЛЮЧЕВЫЕ НАХОДКИ:\n")
 
     for category, results in all_results.items():
-        important = [r for r in results if r['risk_level'] in ['slow', 'low', 'very_low', 'high']]
+        important = [r for r in results if r.risk_level in ['slow', 'low', 'very_low', 'high']]
         if important:
             print(f"  {DETOX_SNPS[category]['name']}:")
             for r in important:
-                print(f"    - {r['gene']} ({r['genotype']}): {r['interpretation']}")
+                print(f"    - {r.gene} ({r.genotype}): {r.interpretation}")
             print()
 
 
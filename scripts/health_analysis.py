@@ -4,14 +4,23 @@ Health SNP Analysis Script
 Analyzes health-related genetic markers from 23andMe data
 """
 
+import hashlib
 import os
-from collections import defaultdict
+import pickle
+import sys
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+from typing import NamedTuple, Optional
 
 # Paths
 BASE_PATH = "/Users/sh/Library/Mobile Documents/com~apple~CloudDocs/dna"
 GENOME_FILE = f"{BASE_PATH}/data/genome_Andre_Sh_v5_Full_20260106100611.txt"
 REPORTS_PATH = f"{BASE_PATH}/reports"
+CACHE_PATH = f"{BASE_PATH}/cache"
+GENOME_CACHE_VERSION = 2  # bump when the parse_genome() layout changes
 
 # =============================================================================
 # SNP DATABASE - Organized by health category
@@ -497,100 +506,155 @@ HEALTH_SNPS = {
 
 
 def load_genome():
-    """Load genome data into a dictionary"""
+    """Load genome data, reusing the parsed copy cached by a previous run"""
+    cache_file = f"{CACHE_PATH}/genome_v{GENOME_CACHE_VERSION}_{genome_digest()}.pickle"
+    try:
+        with open(cache_file, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+        pass  # no cache yet, or a damaged one: re-parse and rewrite it
+
+    genome = parse_genome()
+    os.makedirs(CACHE_PATH, exist_ok=True)
+    # Unique temp file, so scripts sharing this cache never write into the same one
+    fd, tmp_file = tempfile.mkstemp(dir=CACHE_PATH, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(genome, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    return genome
+
+
+def genome_digest():
+    """SHA-256 of the genome file contents, used as the cache key"""
+    # hashlib uses OpenSSL, which picks SHA-NI instructions when the CPU has them
+    digest = hashlib.sha256()
+    with open(GENOME_FILE, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def parse_genome():
+    """Parse the raw genome file into {rsid: (genotype, chromosome, position)}"""
     genome = {}
+    intern = sys.intern  # ~20 distinct genotypes/chromosomes shared by every row
     with open(GENOME_FILE, 'r') as f:
         for line in f:
-            if line.startswith('#'):
+            if line[:1] == '#':
                 continue
-            parts = line.strip().split('\t')
+            parts = line.split('\t', 4)  # trailing columns are never read
             if len(parts) >= 4:
-                rsid, chrom, pos, genotype = parts[0], parts[1], parts[2], parts[3]
-                genome[rsid] = {
-                    'chromosome': chrom,
-                    'position': pos,
-                    'genotype': genotype
-                }
+                genome[parts[0]] = (intern(parts[3].rstrip()), intern(parts[1]), parts[2])
     return genome
 
 
-def normalize_genotype(genotype):
-    """Normalize genotype for comparison (sort alleles)"""
-    if len(genotype) == 2:
-        return ''.join(sorted(genotype))
-    return genotype
-
-
-def analyze_snp(snp_id, snp_info, genome_data):
-    """Analyze a single SNP"""
-    result = {
-        'snp_id': snp_id,
-        'gene': snp_info['gene'],
-        'description': snp_info['description'],
-        'risk_allele': snp_info['risk_allele'],
-        'found': False,
-        'genotype': None,
-        'risk_level': None,
-        'interpretation': None
-    }
-
-    if snp_id in genome_data:
-        result['found'] = True
-        raw_genotype = genome_data[snp_id]['genotype']
-        result['genotype'] = raw_genotype
-        result['chromosome'] = genome_data[snp_id]['chromosome']
-        result['position'] = genome_data[snp_id]['position']
-
-        # Try to find interpretation
-        normalized = normalize_genotype(raw_genotype)
-        interpretations = snp_info.get('interpretation', {})
+# Sorted-allele form of every 2-letter genotype, so normalizing is one lookup
+_NORMALIZED = {a + b: ''.join(sorted(a + b)) for a in 'ACGTDI-' for b in 'ACGTDI-'}
 
-        # Try both original and normalized genotype
-        for gt in [raw_genotype, normalized]:
-            if gt in interpretations:
-                result['risk_level'], result['interpretation'] = interpretations[gt]
-                break
 
-        # If still not found, try reverse
-        if result['interpretation'] is None and len(raw_genotype) == 2:
-            reversed_gt = raw_genotype[::-1]
-            if reversed_gt in interpretations:
-                result['risk_level'], result['interpretation'] = interpretations[reversed_gt]
+def normalize_genotype(genotype):
+    """Normalize genotype for comparison (sort alleles)"""
+    normalized = _NORMALIZED.get(genotype)
+    if normalized is None:
+        normalized = ''.join(sorted(genotype)) if len(genotype) == 2 else genotype
+    return normalized
+
+
+def _expand_interpretation(interpretations):
+    """Add the reversed allele order for every 2-letter genotype key"""
+    table = dict(interpretations)
+    for gt, call in interpretations.items():
+        if len(gt) == 2:
+            table.setdefault(gt[::-1], call)
+    return table
+
+
+# HEALTH_SNPS flattened once at import, interpretations keyed by both allele orders:
+# category -> ((snp_id, gene, description, risk_allele, interpretations), ...)
+SNP_TABLE = {
+    category: tuple(
+        (snp_id, info['gene'], info['description'], info['risk_allele'],
+         _expand_interpretation(info['interpretation']))
+        for snp_id, info in cat_info['snps'].items()
+    )
+    for category, cat_info in HEALTH_SNPS.items()
+}
 
-    return result
+# Category display names
+_CAT_NAMES = {category: cat_info['name'] for category, cat_info in HEALTH_SNPS.items()}
+
+
+class SNPResult(NamedTuple):
+    """Outcome of looking up one SNP in the genome"""
+    snp_id: str
+    gene: str
+    description: str
+    risk_allele: str
+    found: bool = False
+    genotype: Optional[str] = None
+    risk_level: Optional[str] = None
+    interpretation: Optional[str] = None
+    chromosome: Optional[str] = None
+    position: Optional[str] = None
+
+
+def analyze_snp(record, entry):
+    """Analyze a single SNP table record given its genome row (None when absent)"""
+    snp_id, gene, description, risk_allele, interpretations = record
+    if entry is None:
+        return SNPResult(snp_id, gene, description, risk_allele)
+
+    genotype, chromosome, position = entry
+    risk_level, interpretation = interpretations.get(genotype, (None, None))
+    return SNPResult(
+        snp_id, gene, description, risk_allele,
+        True, genotype, risk_level, interpretation, chromosome, position,
+    )
+
+
+def analyze_category(category, genome_data):
+    """Analyze every SNP of a category"""
+    # One hash probe per rsid, straight off the flat table
+    return [analyze_snp(record, genome_data.get(record[0])) for record in SNP_TABLE[category]]
+
+
+# APOE determination table, keyed by normalized (rs429358, rs7412) genotypes
+# rs429358 (C=ε4), rs7412 (T=ε2)
+APOE_TABLE = {
+    ('TT', 'CC'): ('ε2/ε2', 'protective', 'Защитный генотип - пониженный риск Альцгеймера'),
+    ('TT', 'CT'): ('ε2/ε3', 'protective', 'Немного пониженный риск'),
+    ('CT', 'CC'): ('ε2/ε4', 'moderate', 'Смешанный - один защитный, один рисковый аллель'),
+    ('TT', 'TT'): ('ε3/ε3', 'normal', 'Наиболее распространённый генотип - обычный риск'),
+    ('CT', 'CT'): ('ε3/ε4', 'high', 'Повышенный риск Альцгеймера (~3x)'),
+    ('CC', 'TT'): ('ε4/ε4', 'very_high', 'Значительно повышенный риск Альцгеймера (~12x)'),
+    ('CT', 'TT'): ('ε3/ε4', 'high', 'Повышенный риск Альцгеймера (~3x)'),
+    ('CC', 'CT'): ('ε4/ε4 или ε3/ε4', 'high', 'Повышенный риск'),
+}
 
 
 def determine_apoe_genotype(genome):
     """Determine APOE genotype from rs429358 and rs7412"""
-    rs429358 = genome.get('rs429358', {}).get('genotype', '')
-    rs7412 = genome.get('rs7412', {}).get('genotype', '')
-
-    # APOE determination table
-    # rs429358 (C=ε4), rs7412 (T=ε2)
-    apoe_table = {
-        ('TT', 'CC'): ('ε2/ε2', 'protective', 'Защитный генотип - пониженный риск Альцгеймера'),
-        ('TT', 'CT'): ('ε2/ε3', 'protective', 'Немного пониженный риск'),
-        ('CT', 'CC'): ('ε2/ε4', 'moderate', 'Смешанный - один защитный, один рисковый аллель'),
-        ('TT', 'TT'): ('ε3/ε3', 'normal', 'Наиболее распространённый генотип - обычный риск'),
-        ('CT', 'CT'): ('ε3/ε4', 'high', 'Повышенный риск Альцгеймера (~3x)'),
-        ('CC', 'TT'): ('ε4/ε4', 'very_high', 'Значительно повышенный риск Альцгеймера (~12x)'),
-        ('CT', 'TT'): ('ε3/ε4', 'high', 'Повышенный риск Альцгеймера (~3x)'),
-        ('CC', 'CT'): ('ε4/ε4 или ε3/ε4', 'high', 'Повышенный риск'),
-    }
-
-    # Normalize genotypes
-    n429 = normalize_genotype(rs429358)
-    n7412 = normalize_genotype(rs7412)
-
-    for (g1, g2), (apoe, risk, desc) in apoe_table.items():
-        if normalize_genotype(g1) == n429 and normalize_genotype(g2) == n7412:
-            return {
-                'rs429358': rs429358,
-                'rs7412': rs7412,
-                'apoe_genotype': apoe,
-                'risk_level': risk,
-                'interpretation': desc
-            }
+    # Copy, so callers never modify the dict held by the cache
+    return dict(_apoe_call(genome.get('rs429358', ('',))[0], genome.get('rs7412', ('',))[0]))
+
+
+@lru_cache(maxsize=None)
+def _apoe_call(rs429358, rs7412):
+    """APOE call for a genotype pair; shared by the neurology and summary reports"""
+    call = APOE_TABLE.get((normalize_genotype(rs429358), normalize_genotype(rs7412)))
+    if call:
+        apoe, risk, desc = call
+        return {
+            'rs429358': rs429358,
+            'rs7412': rs7412,
+            'apoe_genotype': apoe,
+            'risk_level': risk,
+            'interpretation': desc
+        }
 
     return {
         'rs429358': rs429358,
@@ -601,55 +665,57 @@ def determine_apoe_genotype(genome):
     }
 
 
-def determine_mthfr_status(results):
-    """Determine combined MTHFR status"""
-    c677t = None
-    a1298c = None
+@lru_cache(maxsize=None)
+def _c677t_zygosity(genotype):
+    """C677T risk zygosity: 2 = homozygous, 1 = heterozygous, 0 = none"""
+    if genotype in ('TT', 'AA'):  # TT on forward, AA could be different strand
+        return 2
+    if 'T' in genotype and 'C' in genotype or 'A' in genotype and 'G' in genotype:
+        return 1
+    return 0
 
-    for r in results:
-        if r['snp_id'] == 'rs1801133':
-            c677t = r['genotype']
-        elif r['snp_id'] == 'rs1801131':
-            a1298c = r['genotype']
+
+@lru_cache(maxsize=None)
+def _a1298c_zygosity(genotype):
+    """A1298C risk zygosity: 2 = homozygous, 1 = heterozygous, 0 = none"""
+    # For A1298C, the genotype might be reported as G/T (complement strand)
+    if genotype in ('CC', 'GG'):
+        return 2
+    # GT likely means normal/normal on this assay
+    if len(set(genotype)) == 2 and genotype != 'GT':
+        return 1
+    return 0
+
+
+# (C677T zygosity, A1298C zygosity) -> (status, interpretation)
+_MTHFR_STATUS = {
+    (2, 2): ('severe', 'Значительное снижение активности MTHFR (~10-20%)'),
+    (2, 1): ('severe', 'Значительное снижение активности MTHFR'),
+    (2, 0): ('moderate', 'C677T гомозигота - сниженная активность MTHFR (~30%)'),
+    (1, 2): ('moderate', 'Компаунд - умеренное снижение активности'),
+    (1, 1): ('moderate', 'Компаунд гетерозигота - умеренное снижение'),
+    (1, 0): ('mild', 'C677T гетерозигота - незначительное снижение (~65%)'),
+    (0, 2): ('mild', 'A1298C гомозигота - незначительное снижение'),
+    (0, 1): ('normal', 'Нормальная активность MTHFR'),
+    (0, 0): ('normal', 'Нормальная активность MTHFR'),
+}
+
+
+def determine_mthfr_status(by_id):
+    """Determine combined MTHFR status from results keyed by SNP id"""
+    c677t = by_id['rs1801133'].genotype if 'rs1801133' in by_id else None
+    a1298c = by_id['rs1801131'].genotype if 'rs1801131' in by_id else None
 
     if not c677t or not a1298c:
         return None
+    # Copy, so callers never modify the dict held by the cache
+    return dict(_mthfr_call(c677t, a1298c))
 
-    # Normalize genotypes - C677T: C>T mutation, A1298C: A>C mutation
-    # Count risk alleles
-    c677t_risk = c677t.count('T') if c677t else 0  # T is risk
-    # For A1298C, the genotype might be reported as G/T (complement strand)
-    # A>C on forward = T>G on reverse, so G is risk on reverse
-    a1298c_risk = a1298c.count('C') + a1298c.count('G') if a1298c else 0
-
-    # Check for homozygous risk
-    is_c677t_homo = c677t in ['TT', 'AA']  # TT on forward, AA could be different strand
-    is_c677t_hetero = 'T' in c677t and 'C' in c677t or 'A' in c677t and 'G' in c677t
-    is_a1298c_homo = a1298c in ['CC', 'GG']
-    is_a1298c_hetero = len(set(a1298c)) == 2 if a1298c else False
-
-    # More lenient detection: AG for C677T = heterozygote (strand complement)
-    if c677t == 'AG':
-        is_c677t_hetero = True
-    if a1298c == 'GT':
-        is_a1298c_hetero = False  # GT likely means normal/normal on this assay
-
-    if is_c677t_homo and is_a1298c_homo:
-        status = ('severe', 'Значительное снижение активности MTHFR (~10-20%)')
-    elif is_c677t_homo and is_a1298c_hetero:
-        status = ('severe', 'Значительное снижение активности MTHFR')
-    elif is_c677t_homo:
-        status = ('moderate', 'C677T гомозигота - сниженная активность MTHFR (~30%)')
-    elif is_c677t_hetero and is_a1298c_homo:
-        status = ('moderate', 'Компаунд - умеренное снижение активности')
-    elif is_c677t_hetero and is_a1298c_hetero:
-        status = ('moderate', 'Компаунд гетерозигота - умеренное снижение')
-    elif is_c677t_hetero:
-        status = ('mild', 'C677T гетерозигота - незначительное снижение (~65%)')
-    elif is_a1298c_homo:
-        status = ('mild', 'A1298C гомозигота - незначительное снижение')
-    else:
-        status = ('normal', 'Нормальная активность MTHFR')
+
+@lru_cache(maxsize=None)
+def _mthfr_call(c677t, a1298c):
+    """MTHFR status for a C677T/A1298C genotype pair"""
+    status = _MTHFR_STATUS[_c677t_zygosity(c677t), _a1298c_zygosity(a1298c)]
 
     return {
         'c677t': c677t,
@@ -659,129 +725,157 @@ def determine_mthfr_status(results):
     }
 
 
-def generate_category_report(category, results, genome):
-    """Generate report for a category"""
-    cat_info = HEALTH_SNPS[category]
+# Risk levels in severity order, with their summary emoji
+RISK_ORDER = ('very_high', 'high', 'moderate', 'low', 'normal', 'protective', 'info')
+RISK_EMOJI = ('🔴🔴', '🔴', '🟡', '🟢', '✅', '🛡️', 'ℹ️')
 
-    report = []
-    report.append(f"# {cat_info['name']}")
-    report.append(f"\nДата анализа: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-    report.append("\n## Результаты\n")
+# Risk levels reported as high risk in the summary and console output
+HIGH_RISK = frozenset(('high', 'very_high'))
 
-    # Statistics
-    found = sum(1 for r in results if r['found'])
-    report.append(f"Найдено маркеров: {found}/{len(results)}\n")
+# Pharmacogenomic risk levels listed as key findings in the summary
+_PHARMA_RISK = frozenset(('high', 'moderate'))
 
-    # Risk summary
-    risk_counts = defaultdict(int)
-    for r in results:
-        if r['risk_level']:
-            risk_counts[r['risk_level']] += 1
+# Summary tables in display order: (bucket, heading)
+_SUMMARY_SECTIONS = (
+    ('high', "## 🔴 Маркеры повышенного риска\n"),
+    ('moderate', "## 🟡 Маркеры умеренного риска\n"),
+    ('protective', "## 🛡️ Защитные варианты\n"),
+)
+_SUMMARY_WARNINGS = (
+    "## ⚠️ Важные предупреждения\n",
+    "1. **Это НЕ медицинский диагноз** — только информационный анализ",
+    "2. **Наличие риск-аллеля ≠ заболевание** — пенетрантность варьируется",
+    "3. **Большинство болезней полигенные** — зависят от многих генов + среда",
+    "4. **Для медицинских решений** — консультация генетика обязательна\n",
+)
+_SUMMARY_TABLE_HEADER = (
+    "| Категория | SNP | Ген | Генотип | Описание |",
+    "|-----------|-----|-----|---------|----------|",
+)
+
+
+def _detail_row(result):
+    """Detailed-results table row for one SNPResult"""
+    if not result.found:
+        return f"| {result.snp_id} | {result.gene} | - | - | Не найден в геноме |"
+    return (f"| {result.snp_id} | {result.gene} | **{result.genotype}** | "
+            f"{result.risk_level or 'н/д'} | {result.interpretation or 'Нет данных'} |")
+
+
+def _summary_row(cat_name, result):
+    """Summary finding row for one SNPResult"""
+    return f"| {cat_name} | {result.snp_id} | {result.gene} | **{result.genotype}** | {result.interpretation} |"
+
+
+# Category report skeleton; the risk summary block is empty when nothing was found
+_CATEGORY_TEMPLATE = """# %s
+
+Дата анализа: %s
+
+## Результаты
+
+Найдено маркеров: %d/%d
+%s
+
+### Детальные результаты
 
+| SNP | Ген | Генотип | Риск | Интерпретация |
+|-----|-----|---------|------|---------------|
+%s"""
+
+_APOE_SECTION = """
+
+### APOE генотип (риск Альцгеймера)
+
+- rs429358: %s
+- rs7412: %s
+- **APOE генотип: %s**
+- Риск: %s
+- %s"""
+
+_MTHFR_SECTION = """
+
+### MTHFR статус
+
+- C677T (rs1801133): %s
+- A1298C (rs1801131): %s
+- **Статус: %s**
+- %s"""
+
+
+def analysis_timestamp():
+    """Report timestamp, computed once per run"""
+    return datetime.now().strftime('%Y-%m-%d %H:%M')
+
+
+def generate_category_report(category, results, genome, timestamp=None):
+    """Generate report for a category"""
+    if timestamp is None:
+        timestamp = analysis_timestamp()
+    found = sum(1 for r in results if r.found)
+
+    # Risk summary
+    risk_counts = Counter(r.risk_level for r in results if r.risk_level)
+    risk_block = ''
     if risk_counts:
-        report.append("### Сводка по рискам\n")
-        risk_emoji = {
-            'high': '🔴',
-            'very_high': '🔴🔴',
-            'moderate': '🟡',
-            'low': '🟢',
-            'normal': '✅',
-            'protective': '🛡️',
-            'info': 'ℹ️'
-        }
-        for risk, count in sorted(risk_counts.items()):
-            emoji = risk_emoji.get(risk, '•')
-            report.append(f"- {emoji} {risk}: {count}")
-
-    report.append("\n### Детальные результаты\n")
-    report.append("| SNP | Ген | Генотип | Риск | Интерпретация |")
-    report.append("|-----|-----|---------|------|---------------|")
-
-    for r in results:
-        if r['found']:
-            risk_label = r['risk_level'] or 'н/д'
-            interp = r['interpretation'] or 'Нет данных'
-            report.append(f"| {r['snp_id']} | {r['gene']} | **{r['genotype']}** | {risk_label} | {interp} |")
-        else:
-            report.append(f"| {r['snp_id']} | {r['gene']} | - | - | Не найден в геноме |")
+        risk_block = "\n### Сводка по рискам\n\n" + '\n'.join([
+            f"- {emoji} {risk}: {risk_counts[risk]}"
+            for risk, emoji in zip(RISK_ORDER, RISK_EMOJI) if risk_counts[risk]
+        ])
+
+    table_block = '\n'.join(map(_detail_row, results))
+
+    report = _CATEGORY_TEMPLATE % (
+        _CAT_NAMES[category], timestamp,
+        found, len(results), risk_block, table_block,
+    )
 
     # Special sections
     if category == 'neurology':
-        report.append("\n### APOE генотип (риск Альцгеймера)\n")
         apoe = determine_apoe_genotype(genome)
-        report.append(f"- rs429358: {apoe['rs429358']}")
-        report.append(f"- rs7412: {apoe['rs7412']}")
-        report.append(f"- **APOE генотип: {apoe['apoe_genotype']}**")
-        report.append(f"- Риск: {apoe['risk_level']}")
-        report.append(f"- {apoe['interpretation']}")
+        report += _APOE_SECTION % (apoe['rs429358'], apoe['rs7412'], apoe['apoe_genotype'],
+                                   apoe['risk_level'], apoe['interpretation'])
 
     if category == 'cardiovascular':
-        mthfr = determine_mthfr_status(results)
+        mthfr = determine_mthfr_status({r.snp_id: r for r in results})
         if mthfr:
-            report.append("\n### MTHFR статус\n")
-            report.append(f"- C677T (rs1801133): {mthfr['c677t']}")
-            report.append(f"- A1298C (rs1801131): {mthfr['a1298c']}")
-            report.append(f"- **Статус: {mthfr['status']}**")
-            report.append(f"- {mthfr['interpretation']}")
+            report += _MTHFR_SECTION % (mthfr['c677t'], mthfr['a1298c'], mthfr['status'],
+                                        mthfr['interpretation'])
 
-    return '\n'.join(report)
+    return report
 
 
-def generate_summary_report(all_results, genome):
+def generate_summary_report(all_results, genome, total_snps, found_snps, timestamp=None):
     """Generate overall summary report"""
-    report = []
-    report.append("# 📊 Сводный отчёт по здоровью")
-    report.append(f"\nДата анализа: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-    report.append("\n---\n")
-
-    report.append("## ⚠️ Важные предупреждения\n")
-    report.append("1. **Это НЕ медицинский диагноз** — только информационный анализ")
-    report.append("2. **Наличие риск-аллеля ≠ заболевание** — пенетрантность варьируется")
-    report.append("3. **Большинство болезней полигенные** — зависят от многих генов + среда")
-    report.append("4. **Для медицинских решений** — консультация генетика обязательна\n")
+    if timestamp is None:
+        timestamp = analysis_timestamp()
 
+    report = ["# 📊 Сводный отчёт по здоровью", f"\nДата анализа: {timestamp}", "\n---\n"]
+    report.extend(_SUMMARY_WARNINGS)
     report.append("---\n")
 
-    # Collect high-risk findings
-    high_risk = []
-    moderate_risk = []
-    protective = []
-
+    # Bucket high/moderate/protective findings and key drug findings in one pass
+    buckets = {'high': [], 'moderate': [], 'protective': []}
+    important_drugs = []
     for category, results in all_results.items():
+        cat_name = _CAT_NAMES[category]
+        is_pharma = category == 'pharmacogenomics'
         for r in results:
-            if r['risk_level'] in ['high', 'very_high']:
-                high_risk.append((category, r))
-            elif r['risk_level'] == 'moderate':
-                moderate_risk.append((category, r))
-            elif r['risk_level'] == 'protective':
-                protective.append((category, r))
-
-    if high_risk:
-        report.append("## 🔴 Маркеры повышенного риска\n")
-        report.append("| Категория | SNP | Ген | Генотип | Описание |")
-        report.append("|-----------|-----|-----|---------|----------|")
-        for cat, r in high_risk:
-            cat_name = HEALTH_SNPS[cat]['name']
-            report.append(f"| {cat_name} | {r['snp_id']} | {r['gene']} | **{r['genotype']}** | {r['interpretation']} |")
-        report.append("")
-
-    if moderate_risk:
-        report.append("## 🟡 Маркеры умеренного риска\n")
-        report.append("| Категория | SNP | Ген | Генотип | Описание |")
-        report.append("|-----------|-----|-----|---------|----------|")
-        for cat, r in moderate_risk:
-            cat_name = HEALTH_SNPS[cat]['name']
-            report.append(f"| {cat_name} | {r['snp_id']} | {r['gene']} | **{r['genotype']}** | {r['interpretation']} |")
-        report.append("")
-
-    if protective:
-        report.append("## 🛡️ Защитные варианты\n")
-        report.append("| Категория | SNP | Ген | Генотип | Описание |")
-        report.append("|-----------|-----|-----|---------|----------|")
-        for cat, r in protective:
-            cat_name = HEALTH_SNPS[cat]['name']
-            report.append(f"| {cat_name} | {r['snp_id']} | {r['gene']} | **{r['genotype']}** | {r['interpretation']} |")
-        report.append("")
+            level = r.risk_level
+            if level in HIGH_RISK:
+                buckets['high'].append((cat_name, r))
+            elif level in buckets:
+                buckets[level].append((cat_name, r))
+            if is_pharma and r.found and level in _PHARMA_RISK:
+                important_drugs.append(f"- **{r.gene}** ({r.genotype}): {r.interpretation}")
+
+    for bucket, heading in _SUMMARY_SECTIONS:
+        findings = buckets[bucket]
+        if findings:
+            report.append(heading)
+            report.extend(_SUMMARY_TABLE_HEADER)
+            report.extend([_summary_row(cat_name, r) for cat_name, r in findings])
+            report.append("")
 
     # Special analyses
     report.append("---\n")
@@ -795,7 +889,7 @@ def generate_summary_report(all_results, genome):
 
     # MTHFR
     cardio_results = all_results.get('cardiovascular', [])
-    mthfr = determine_mthfr_status(cardio_results)
+    mthfr = determine_mthfr_status({r.snp_id: r for r in cardio_results})
     if mthfr:
         report.append("### MTHFR (Метаболизм фолатов)\n")
         report.append(f"- C677T: {mthfr['c677t']}, A1298C: {mthfr['a1298c']}")
@@ -804,12 +898,6 @@ def generate_summary_report(all_results, genome):
 
     # Pharmacogenomics summary
     report.append("### 💊 Фармакогеномика - ключевые находки\n")
-    pharma = all_results.get('pharmacogenomics', [])
-    important_drugs = []
-    for r in pharma:
-        if r['found'] and r['risk_level'] in ['high', 'moderate']:
-            important_drugs.append(f"- **{r['gene']}** ({r['genotype']}): {r['interpretation']}")
-
     if important_drugs:
         report.extend(important_drugs)
     else:
@@ -817,13 +905,6 @@ def generate_summary_report(all_results, genome):
 
     report.append("\n---\n")
     report.append("## 📈 Статистика анализа\n")
-
-    total_snps = 0
-    found_snps = 0
-    for cat, results in all_results.items():
-        total_snps += len(results)
-        found_snps += sum(1 for r in results if r['found'])
-
     report.append(f"- Всего проанализировано SNP: {total_snps}")
     report.append(f"- Найдено в геноме: {found_snps}")
     report.append(f"- Не найдено: {total_snps - found_snps}")
@@ -831,6 +912,12 @@ def generate_summary_report(all_results, genome):
     return '\n'.join(report)
 
 
+def write_report(path, text):
+    """Write a report as UTF-8 with a single write() call"""
+    with open(path, 'wb') as f:
+        f.write(text.encode('utf-8'))
+
+
 def main():
     print("=" * 60)
     print("АНАЛИЗ ЗДОРОВЬЯ ПО ГЕНОМУ 23andMe")
@@ -842,48 +929,57 @@ def main():
 
     print("\n[2/4] Анализ маркеров по категориям...")
     all_results = {}
+    total_snps = 0
+    found_snps = 0
 
-    for category, cat_info in HEALTH_SNPS.items():
-        print(f"      → {cat_info['name']}...")
-        results = []
-        for snp_id, snp_info in cat_info['snps'].items():
-            result = analyze_snp(snp_id, snp_info, genome)
-            results.append(result)
+    for category, cat_name in _CAT_NAMES.items():
+        print(f"      → {cat_name}...")
+        results = analyze_category(category, genome)
         all_results[category] = results
 
         # Count found
-        found = sum(1 for r in results if r['found'])
+        found = sum(1 for r in results if r.found)
         print(f"        Найдено: {found}/{len(results)}")
+        total_snps += len(results)
+        found_snps += found
+
+    timestamp = analysis_timestamp()
 
     print("\n[3/4] Генерация отчётов по категориям...")
-    for category, results in all_results.items():
-        report = generate_category_report(category, results, genome)
-        report_path = f"{REPORTS_PATH}/{category}/report.md"
-        with open(report_path, 'w', encoding='utf-8') as f:
-            f.write(report)
-        print(f"      → {report_path}")
+    report_dirs = {category: f"{REPORTS_PATH}/{category}" for category in all_results}
+    for report_dir in report_dirs.values():
+        os.makedirs(report_dir, exist_ok=True)
+
+    def render(category):
+        report_path = f"{report_dirs[category]}/report.md"
+        write_report(report_path, generate_category_report(category, all_results[category], genome, timestamp))
+        return report_path
+
+    # Threads rather than processes: the neurology report needs the whole genome,
+    # and each worker also writes its file so the writes overlap
+    with ThreadPoolExecutor() as executor:
+        for report_path in executor.map(render, all_results):
+            print(f"      → {report_path}")
 
     print("\n[4/4] Генерация сводного отчёта...")
-    summary = generate_summary_report(all_results, genome)
+    summary = generate_summary_report(all_results, genome, total_snps, found_snps, timestamp)
     summary_path = f"{REPORTS_PATH}/health_summary.md"
-    with open(summary_path, 'w', encoding='utf-8') as f:
-        f.write(summary)
+    write_report(summary_path, summary)
     print(f"      → {summary_path}")
 
     print("\n" + "=" * 60)
     print("АНАЛИЗ ЗАВЕРШЁН")
     print("=" * 60)
 
-    # Print key findings to console
-    print("\n🔑 КЛЮЧЕВЫЕ НАХОДКИ:\n")
-
+    # Print key findings to console in one write
+    lines = ["\n🔑 КЛЮЧЕВЫЕ НАХОДКИ:\n"]
     for category, results in all_results.items():
-        high_risk = [r for r in results if r['risk_level'] in ['high', 'very_high']]
+        high_risk = [r for r in results if r.risk_level in HIGH_RISK]
         if high_risk:
-            print(f"⚠️  {HEALTH_SNPS[category]['name']}:")
-            for r in high_risk:
-                print(f"    • {r['gene']} ({r['genotype']}): {r['interpretation']}")
-            print()
+            lines.append(f"⚠️  {_CAT_NAMES[category]}:")
+            lines.extend([f"    • {r.gene} ({r.genotype}): {r.interpretation}" for r in high_risk])
+            lines.append("")
+    sys.stdout.write('\n'.join(lines) + '\n')
 
 
 if __name__ == "__main__":
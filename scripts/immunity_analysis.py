@@ -5,8 +5,11 @@ Analyzes immunity-related genetic markers from 23andMe data
 """
 
 import os
-from collections import defaultdict
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import NamedTuple, Optional
 
 # Paths
 BASE_PATH = "/Users/sh/Library/Mobile Documents/com~apple~CloudDocs/dna"
@@ -311,67 +314,78 @@ IMMUNITY_SNPS = {
 
 
 def load_genome():
-    """Load genome data into a dictionary"""
+    """Load WANTED_SNPS as {rsid: genotype} and {rsid: (chromosome, position)}, plus the file's SNP count"""
     genome = {}
-    with open(GENOME_FILE, 'r') as f:
+    genome_meta = {}
+    snp_count = 0
+    intern = sys.intern  # a handful of distinct genotypes shared by every row
+    with open(GENOME_FILE, 'r', buffering=1 << 20) as f:
         for line in f:
-            if line.startswith('#'):
+            if line[:1] == '#':
                 continue
-            parts = line.strip().split('\t')
+            parts = line.split('\t', 4)  # trailing columns are never read
             if len(parts) >= 4:
-                rsid, chrom, pos, genotype = parts[0], parts[1], parts[2], parts[3]
-                genome[rsid] = {
-                    'chromosome': chrom,
-                    'position': pos,
-                    'genotype': genotype
-                }
-    return genome
-
-
-def normalize_genotype(genotype):
-    """Normalize genotype for comparison (sort alleles)"""
-    if len(genotype) == 2:
-        return ''.join(sorted(genotype))
-    return genotype
-
-
-def analyze_snp(snp_id, snp_info, genome_data):
-    """Analyze a single SNP"""
-    result = {
-        'snp_id': snp_id,
-        'gene': snp_info['gene'],
-        'description': snp_info['description'],
-        'risk_allele': snp_info['risk_allele'],
-        'found': False,
-        'genotype': None,
-        'risk_level': None,
-        'interpretation': None
-    }
+                snp_count += 1
+                rsid = parts[0]
+                if rsid in WANTED_SNPS:
+                    genome[rsid] = intern(parts[3].rstrip().upper())  # interpretation keys are upper-case
+                    genome_meta[rsid] = (parts[1], parts[2])
+    return genome, genome_meta, snp_count
+
+
+def _expand_interpretation(interpretations):
+    """Add the reversed allele order for every 2-letter genotype key"""
+    # Sorted and reversed forms coincide for 2-letter keys; listed keys keep priority
+    table = dict(interpretations)
+    for gt, call in interpretations.items():
+        if len(gt) == 2:
+            table.setdefault(gt[::-1], call)
+    return table
+
+
+# IMMUNITY_SNPS flattened once at import, interpretations keyed by both allele orders:
+# category -> ((snp_id, gene, description, risk_allele, interpretations), ...)
+_COMPILED = {
+    category: tuple(
+        (snp_id, info['gene'], info['description'], info['risk_allele'],
+         _expand_interpretation(info['interpretation']))
+        for snp_id, info in cat_info['snps'].items()
+    )
+    for category, cat_info in IMMUNITY_SNPS.items()
+}
+
+# Every rsid the analysis reads; only these keep chromosome/position
+WANTED_SNPS = frozenset(record[0] for records in _COMPILED.values() for record in records)
 
-    if snp_id in genome_data:
-        result['found'] = True
-        raw_genotype = genome_data[snp_id]['genotype']
-        result['genotype'] = raw_genotype
-        result['chromosome'] = genome_data[snp_id]['chromosome']
-        result['position'] = genome_data[snp_id]['position']
 
-        # Try to find interpretation
-        normalized = normalize_genotype(raw_genotype)
-        interpretations = snp_info.get('interpretation', {})
+class SNPResult(NamedTuple):
+    """Outcome of looking up one SNP in the genome"""
+    snp_id: str
+    gene: str
+    description: str
+    risk_allele: str
+    found: bool = False
+    genotype: Optional[str] = None
+    risk_level: Optional[str] = None
+    interpretation: Optional[str] = None
+    chromosome: Optional[str] = None
+    position: Optional[str] = None
+    has_risk_allele: bool = False
 
-        # Try both original and normalized genotype
-        for gt in [raw_genotype, normalized]:
-            if gt in interpretations:
-                result['risk_level'], result['interpretation'] = interpretations[gt]
-                break
 
-        # If still not found, try reverse
-        if result['interpretation'] is None and len(raw_genotype) == 2:
-            reversed_gt = raw_genotype[::-1]
-            if reversed_gt in interpretations:
-                result['risk_level'], result['interpretation'] = interpretations[reversed_gt]
+def analyze_snp(record, genotype, genome_meta):
+    """Analyze a single SNP table record given its genotype (None when absent)"""
+    snp_id, gene, description, risk_allele, interpretations = record
+    if genotype is None:
+        return SNPResult(snp_id, gene, description, risk_allele)
 
-    return result
+    risk_level, interpretation = interpretations.get(genotype, (None, None))
+    chromosome, position = genome_meta[snp_id]
+    return SNPResult(
+        snp_id, gene, description, risk_allele,
+        True, genotype, risk_level, interpretation, chromosome, position,
+        risk_allele in genotype,
+    )
 
 
 def determine_celiac_risk(results):
@@ -380,20 +394,20 @@ def determine_celiac_risk(results):
     dq8 = None
 
     for r in results:
-        if r['snp_id'] == 'rs2187668':
+        if r.snp_id == 'rs2187668':
             dq2 = r
-        elif r['snp_id'] == 'rs7454108':
+        elif r.snp_id == 'rs7454108':
             dq8 = r
 
     if not dq2 or not dq8:
         return None
 
-    dq2_gt = dq2.get('genotype', '')
-    dq8_gt = dq8.get('genotype', '')
+    dq2_gt = dq2.genotype
+    dq8_gt = dq8.genotype
 
-    # Risk assessment
-    dq2_risk = 'T' in dq2_gt if dq2_gt else False
-    dq8_risk = 'C' in dq8_gt if dq8_gt else False
+    # Risk assessment: T for DQ2.5, C for DQ8
+    dq2_risk = dq2.has_risk_allele
+    dq8_risk = dq8.has_risk_allele
 
     if dq2_gt == 'TT':
         status = ('very_high', 'HLA-DQ2.5 гомозигота - очень высокий риск целиакии (>50%)')
@@ -414,6 +428,16 @@ def determine_celiac_risk(results):
     }
 
 
+# Pro-inflammatory cytokine SNPs, raised when the risk allele is present:
+# snp_id -> (label, raised description)
+_CYTOKINE_MARKERS = {
+    'rs1800629': ('TNF-alpha', 'повышен'),
+    'rs1800795': ('IL-6', 'повышен'),
+    'rs16944': ('IL-1beta', 'повышен'),
+    'rs20541': ('IL-13', 'повышен (аллергия)'),
+}
+
+
 def determine_inflammation_profile(results):
     """Determine overall inflammation profile from cytokine SNPs"""
     proinflammatory = 0
@@ -423,44 +447,26 @@ def determine_inflammation_profile(results):
     cytokine_info = []
 
     for r in results:
-        if not r['found']:
+        if not r.found:
             continue
         total += 1
+        genotype = r.genotype
 
-        if r['snp_id'] == 'rs1800629':  # TNF-alpha
-            if 'A' in r['genotype']:
+        marker = _CYTOKINE_MARKERS.get(r.snp_id)
+        if marker:
+            label, raised = marker
+            if r.has_risk_allele:
                 proinflammatory += 1
-                cytokine_info.append(f"TNF-alpha ({r['genotype']}): повышен")
+                cytokine_info.append(f"{label} ({genotype}): {raised}")
             else:
-                cytokine_info.append(f"TNF-alpha ({r['genotype']}): норма")
+                cytokine_info.append(f"{label} ({genotype}): норма")
 
-        elif r['snp_id'] == 'rs1800795':  # IL-6
-            if 'C' in r['genotype']:
-                proinflammatory += 1
-                cytokine_info.append(f"IL-6 ({r['genotype']}): повышен")
-            else:
-                cytokine_info.append(f"IL-6 ({r['genotype']}): норма")
-
-        elif r['snp_id'] == 'rs1800896':  # IL-10 (anti-inflammatory)
-            if r['genotype'] == 'GG':
+        elif r.snp_id == 'rs1800896':  # IL-10 (anti-inflammatory)
+            if genotype == 'GG':
                 antiinflammatory += 1
-                cytokine_info.append(f"IL-10 ({r['genotype']}): высокий (защитный)")
-            elif 'A' in r['genotype']:
-                cytokine_info.append(f"IL-10 ({r['genotype']}): снижен")
-
-        elif r['snp_id'] == 'rs16944':  # IL-1beta
-            if 'A' in r['genotype']:
-                proinflammatory += 1
-                cytokine_info.append(f"IL-1beta ({r['genotype']}): повышен")
-            else:
-                cytokine_info.append(f"IL-1beta ({r['genotype']}): норма")
-
-        elif r['snp_id'] == 'rs20541':  # IL-13
-            if 'A' in r['genotype']:
-                proinflammatory += 1
-                cytokine_info.append(f"IL-13 ({r['genotype']}): повышен (аллергия)")
-            else:
-                cytokine_info.append(f"IL-13 ({r['genotype']}): норма")
+                cytokine_info.append(f"IL-10 ({genotype}): высокий (защитный)")
+            elif r.has_risk_allele:  # A
+                cytokine_info.append(f"IL-10 ({genotype}): снижен")
 
     if total == 0:
         return None
@@ -484,60 +490,110 @@ def determine_inflammation_profile(results):
     }
 
 
-def generate_category_report(category, results, genome):
+# Risk level -> summary emoji
+RISK_EMOJI = {
+    'high': '🔴',
+    'very_high': '🔴🔴',
+    'moderate': '🟡',
+    'low': '🟢',
+    'normal': '✅',
+    'protective': '🛡️',
+    'info': 'ℹ️'
+}
+
+# Risk levels reported as high risk in the summary and console output
+HIGH_RISK = frozenset(('high', 'very_high'))
+
+# Markdown table headers
+_DETAIL_TABLE_HEADER = (
+    "| SNP | Ген | Генотип | Риск | Интерпретация |",
+    "|-----|-----|---------|------|---------------|",
+)
+_SUMMARY_TABLE_HEADER = (
+    "| Категория | SNP | Ген | Генотип | Описание |",
+    "|-----------|-----|-----|---------|----------|",
+)
+
+
+def analysis_timestamp():
+    """Report timestamp, computed once per run"""
+    return datetime.now().strftime('%Y-%m-%d %H:%M')
+
+
+def generate_category_report(category, results, genome, timestamp=None):
     """Generate report for a category"""
+    if timestamp is None:
+        timestamp = analysis_timestamp()
     cat_info = IMMUNITY_SNPS[category]
 
     report = []
     report.append(f"# {cat_info['name']}")
-    report.append(f"\nДата анализа: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+    report.append(f"\nДата анализа: {timestamp}")
     report.append("\n## Результаты\n")
 
     # Statistics
-    found = sum(1 for r in results if r['found'])
+    found = sum(1 for r in results if r.found)
     report.append(f"Найдено маркеров: {found}/{len(results)}\n")
 
     # Risk summary
-    risk_counts = defaultdict(int)
-    for r in results:
-        if r['risk_level']:
-            risk_counts[r['risk_level']] += 1
+    risk_counts = Counter(r.risk_level for r in results if r.risk_level)
 
     if risk_counts:
         report.append("### Сводка по рискам\n")
-        risk_emoji = {
-            'high': '🔴',
-            'very_high': '🔴🔴',
-            'moderate': '🟡',
-            'low': '🟢',
-            'normal': '✅',
-            'protective': '🛡️',
-            'info': 'ℹ️'
-        }
         for risk, count in sorted(risk_counts.items()):
-            emoji = risk_emoji.get(risk, '•')
+            emoji = RISK_EMOJI.get(risk, '•')
             report.append(f"- {emoji} {risk}: {count}")
 
     report.append("\n### Детальные результаты\n")
-    report.append("| SNP | Ген | Генотип | Риск | Интерпретация |")
-    report.append("|-----|-----|---------|------|---------------|")
+    report.extend(_DETAIL_TABLE_HEADER)
 
     for r in results:
-        if r['found']:
-            risk_label = r['risk_level'] or 'н/д'
-            interp = r['interpretation'] or 'Нет данных'
-            report.append(f"| {r['snp_id']} | {r['gene']} | **{r['genotype']}** | {risk_label} | {interp} |")
+        if r.found:
+            risk_label = r.risk_level or 'н/д'
+            interp = r.interpretation or 'Нет данных'
+            report.append(f"| {r.snp_id} | {r.gene} | **{r.genotype}** | {risk_label} | {interp} |")
         else:
-            report.append(f"| {r['snp_id']} | {r['gene']} | - | - | Не найден в геноме |")
+            report.append(f"| {r.snp_id} | {r.gene} | - | - | Не найден в геноме |")
 
     return '\n'.join(report)
 
 
-def generate_summary_report(all_results, genome):
+def _summary_row(cat_name, result):
+    """Summary finding row for one SNPResult"""
+    return f"| {cat_name} | {result.snp_id} | {result.gene} | **{result.genotype}** | {result.interpretation} |"
+
+
+# Summary tables in display order: (bucket, heading)
+_SUMMARY_SECTIONS = (
+    ('high', "## Маркеры повышенного риска\n"),
+    ('moderate', "## Маркеры умеренного риска\n"),
+    ('protective', "## Защитные варианты\n"),
+)
+
+
+def bucket_findings(all_results):
+    """Group findings into high/moderate/protective buckets of (category name, result)"""
+    buckets = {'high': [], 'moderate': [], 'protective': []}
+    for category, results in all_results.items():
+        cat_name = IMMUNITY_SNPS[category]['name']
+        for r in results:
+            level = r.risk_level
+            if level in HIGH_RISK:
+                buckets['high'].append((cat_name, r))
+            elif level in buckets:
+                buckets[level].append((cat_name, r))
+    return buckets
+
+
+def generate_summary_report(all_results, genome, timestamp=None, buckets=None):
     """Generate overall immunity summary report"""
+    if timestamp is None:
+        timestamp = analysis_timestamp()
+    if buckets is None:
+        buckets = bucket_findings(all_results)
     report = []
     report.append("# Анализ иммунитета")
-    report.append(f"\nДата анализа: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+    report.append(f"\nДата анализа: {timestamp}")
     report.append("\n---\n")
 
     report.append("## Важные предупреждения\n")
@@ -548,46 +604,13 @@ def generate_summary_report(all_results, genome):
 
     report.append("---\n")
 
-    # Collect findings by risk level
-    high_risk = []
-    moderate_risk = []
-    protective = []
-
-    for category, results in all_results.items():
-        for r in results:
-            if r['risk_level'] in ['high', 'very_high']:
-                high_risk.append((category, r))
-            elif r['risk_level'] == 'moderate':
-                moderate_risk.append((category, r))
-            elif r['risk_level'] == 'protective':
-                protective.append((category, r))
-
-    if high_risk:
-        report.append("## Маркеры повышенного риска\n")
-        report.append("| Категория | SNP | Ген | Генотип | Описание |")
-        report.append("|-----------|-----|-----|---------|----------|")
-        for cat, r in high_risk:
-            cat_name = IMMUNITY_SNPS[cat]['name']
-            report.append(f"| {cat_name} | {r['snp_id']} | {r['gene']} | **{r['genotype']}** | {r['interpretation']} |")
-        report.append("")
-
-    if moderate_risk:
-        report.append("## Маркеры умеренного риска\n")
-        report.append("| Категория | SNP | Ген | Генотип | Описание |")
-        report.append("|-----------|-----|-----|---------|----------|")
-        for cat, r in moderate_risk:
-            cat_name = IMMUNITY_SNPS[cat]['name']
-            report.append(f"| {cat_name} | {r['snp_id']} | {r['gene']} | **{r['genotype']}** | {r['interpretation']} |")
-        report.append("")
-
-    if protective:
-        report.append("## Защитные варианты\n")
-        report.append("| Категория | SNP | Ген | Генотип | Описание |")
-        report.append("|-----------|-----|-----|---------|----------|")
-        for cat, r in protective:
-            cat_name = IMMUNITY_SNPS[cat]['name']
-            report.append(f"| {cat_name} | {r['snp_id']} | {r['gene']} | **{r['genotype']}** | {r['interpretation']} |")
-        report.append("")
+    for bucket, heading in _SUMMARY_SECTIONS:
+        findings = buckets[bucket]
+        if findings:
+            report.append(heading)
+            report.extend(_SUMMARY_TABLE_HEADER)
+            report.extend([_summary_row(cat_name, r) for cat_name, r in findings])
+            report.append("")
 
     # Special analyses
     report.append("---\n")
@@ -621,9 +644,9 @@ def generate_summary_report(all_results, genome):
     report.append("### Устойчивость к инфекциям\n")
     infection_results = all_results.get('infections', [])
     for r in infection_results:
-        if r['found']:
-            status = "защитный" if r['risk_level'] == 'protective' else r['risk_level'] or 'н/д'
-            report.append(f"- **{r['gene']}** ({r['genotype']}): {r['interpretation']}")
+        if r.found:
+            status = "защитный" if r.risk_level == 'protective' else r.risk_level or 'н/д'
+            report.append(f"- **{r.gene}** ({r.genotype}): {r.interpretation}")
 
     report.append("\n---\n")
     report.append("## Статистика анализа\n")
@@ -632,7 +655,7 @@ def generate_summary_report(all_results, genome):
     found_snps = 0
     for cat, results in all_results.items():
         total_snps += len(results)
-        found_snps += sum(1 for r in results if r['found'])
+        found_snps += sum(1 for r in results if r.found)
 
     report.append(f"- Всего проанализировано SNP: {total_snps}")
     report.append(f"- Найдено в геноме: {found_snps}")
@@ -657,71 +680,90 @@ def generate_summary_report(all_results, genome):
     return '\n'.join(report)
 
 
+def write_report(path, text):
+    """Write a report as UTF-8 with a single write() call"""
+    with open(path, 'wb') as f:
+        f.write(text.encode('utf-8'))
+
+
 def main():
     print("=" * 60)
     print("АНАЛИЗ ИММУНИТЕТА ПО ГЕНОМУ 23andMe")
     print("=" * 60)
 
     print("\n[1/4] Загрузка генома...")
-    genome = load_genome()
-    print(f"      Загружено {len(genome)} SNP")
+    genome, genome_meta, snp_count = load_genome()
+    print(f"      Загружено {snp_count} SNP")
 
     print("\n[2/4] Анализ маркеров по категориям...")
     all_results = {}
 
     for category, cat_info in IMMUNITY_SNPS.items():
         print(f"      -> {cat_info['name']}...")
-        results = []
-        for snp_id, snp_info in cat_info['snps'].items():
-            result = analyze_snp(snp_id, snp_info, genome)
-            results.append(result)
+        results = [
+            analyze_snp(record, genome.get(record[0]), genome_meta)
+            for record in _COMPILED[category]
+        ]
         all_results[category] = results
 
         # Count found
-        found = sum(1 for r in results if r['found'])
+        found = sum(1 for r in results if r.found)
         print(f"        Найдено: {found}/{len(results)}")
 
-    print("\n[3/4] Генерация отчётов по категориям...")
-    for category, results in all_results.items():
-        report = generate_category_report(category, results, genome)
-        report_dir = f"{REPORTS_PATH}/{category}"
+    timestamp = analysis_timestamp()
+    buckets = bucket_findings(all_results)
+
+    # Create every report directory once, before rendering
+    report_dirs = {category: f"{REPORTS_PATH}/{category}" for category in all_results}
+    summary_dir = f"{REPORTS_PATH}/immunity"
+    for report_dir in (*report_dirs.values(), summary_dir):
         os.makedirs(report_dir, exist_ok=True)
-        report_path = f"{report_dir}/report.md"
-        with open(report_path, 'w', encoding='utf-8') as f:
-            f.write(report)
-        print(f"      -> {report_path}")
+
+    def render(category):
+        report_path = f"{report_dirs[category]}/report.md"
+        write_report(report_path, generate_category_report(category, all_results[category], genome, timestamp))
+        return report_path
+
+    print("\n[3/4] Генерация отчётов по категориям...")
+    # Each worker renders and writes one category, so the file writes overlap
+    with ThreadPoolExecutor() as executor:
+        for report_path in executor.map(render, all_results):
+            print(f"      -> {report_path}")
 
     print("\n[4/4] Генерация сводного отчёта...")
-    summary = generate_summary_report(all_results, genome)
-    summary_dir = f"{REPORTS_PATH}/immunity"
-    os.makedirs(summary_dir, exist_ok=True)
+    summary = generate_summary_report(all_results, genome, timestamp, buckets)
     summary_path = f"{summary_dir}/report.md"
-    with open(summary_path, 'w', encoding='utf-8') as f:
-        f.write(summary)
+    write_report(summary_path, summary)
     print(f"      -> {summary_path}")
 
     print("\n" + "=" * 60)
     print("АНАЛИЗ ЗАВЕРШЁН")
     print("=" * 60)
 
-    # Print key findings to console
-    print("\nКЛЮЧЕВЫЕ НАХОДКИ:\n")
+    # Print key findings to console, regrouping the summary buckets by category
+    high_by_cat = {}
+    for cat_name, r in buckets['high']:
+        high_by_cat.setdefault(cat_name, []).append(r)
+    protective_by_cat = {}
+    for cat_name, r in buckets['protective']:
+        protective_by_cat.setdefault(cat_name, []).append(r)
 
-    for category, results in all_results.items():
-        high_risk = [r for r in results if r['risk_level'] in ['high', 'very_high']]
-        protective_found = [r for r in results if r['risk_level'] == 'protective']
+    lines = ["\nКЛЮЧЕВЫЕ НАХОДКИ:\n"]
+    for category in all_results:
+        cat_name = IMMUNITY_SNPS[category]['name']
+        high_risk = high_by_cat.get(cat_name)
+        protective_found = protective_by_cat.get(cat_name)
 
         if high_risk:
-            print(f"  {IMMUNITY_SNPS[category]['name']}:")
-            for r in high_risk:
-                print(f"    * {r['gene']} ({r['genotype']}): {r['interpretation']}")
-            print()
+            lines.append(f"  {cat_name}:")
+            lines.extend([f"    * {r.gene} ({r.genotype}): {r.interpretation}" for r in high_risk])
+            lines.append("")
 
         if protective_found:
-            print(f"  {IMMUNITY_SNPS[category]['name']} (защитные):")
-            for r in protective_found:
-                print(f"    + {r['gene']} ({r['genotype']}): {r['interpretation']}")
-            print()
+            lines.append(f"  {cat_name} (защитные):")
+            lines.extend([f"    + {r.gene} ({r.genotype}): {r.interpretation}" for r in protective_found])
+            lines.append("")
+    sys.stdout.write('\n'.join(lines) + '\n')
 
 
 if __name__ == "__main__":
@@ -4,14 +4,22 @@ Longevity and Aging Analysis Script
 Analyzes genetic markers associated with lifespan, aging, and anti-aging pathways from 23andMe data
 """
 
+import hashlib
+import math
 import os
+import pickle
+import tempfile
 from datetime import datetime
-from collections import defaultdict
+from collections import Counter, defaultdict
+from functools import lru_cache
+from operator import itemgetter
 
 # Paths
 BASE_PATH = "/Users/sh/Library/Mobile Documents/com~apple~CloudDocs/dna"
 GENOME_FILE = f"{BASE_PATH}/data/genome_Andre_Sh_v5_Full_20260106100611.txt"
 REPORTS_PATH = f"{BASE_PATH}/reports"
+CACHE_PATH = f"{BASE_PATH}/cache"
+GENOME_CACHE_VERSION = 2  # bump when the parse_genome() layout changes
 
 # =============================================================================
 # SNP DATABASE - Longevity and Aging Markers
@@ -272,6 +280,37 @@ LONGEVITY_SNPS = {
     },
 }
 
+
+def _canonicalize(table):
+    """Pad every entry to (status, description, description_ru, score) and add reversed allele orders"""
+    out = {gt: interp if len(interp) > 3 else (*interp, 0) for gt, interp in table.items()}
+    for gt, interp in list(out.items()):
+        if len(gt) == 2:
+            out.setdefault(gt[::-1], interp)
+    return out
+
+
+# LONGEVITY_SNPS flattened once at import, interpretations keyed by both allele orders:
+# rsid -> (category, gene, description, description_ru, interpretation)
+SNP_INDEX = {
+    rsid: (category, snp["gene"], snp["description"], snp["description_ru"],
+           _canonicalize(snp["interpretation"]))
+    for category, category_data in LONGEVITY_SNPS.items()
+    for rsid, snp in category_data["snps"].items()
+}
+
+# category -> (name, name_ru, rsids), in report order
+CATEGORY_META = {
+    category: (data["name"], data["name_ru"], tuple(data["snps"]))
+    for category, data in LONGEVITY_SNPS.items()
+}
+
+# Every rsid the analysis reads; load_genome() keeps only these
+WANTED_RSIDS = frozenset(SNP_INDEX) | {"rs429358", "rs7412"}
+
+# Part of the genome cache key, so a cache filtered to an older rsid set is never reused
+WANTED_DIGEST = hashlib.sha256(",".join(sorted(WANTED_RSIDS)).encode()).hexdigest()[:8]
+
 # APOE Genotype determination table
 # rs429358: T=ancestral, C=derived (ε4)
 # rs7412: C=ancestral, T=derived (ε2)
@@ -284,94 +323,104 @@ APOE_GENOTYPES = {
     ("CC", "CC"): ("ε4/ε4", "Two ε4 alleles - significantly increased Alzheimer's risk", "Два аллеля ε4 - значительно повышенный риск Альцгеймера"),
 }
 
+# Longevity score contribution by (ε4 count, ε2 count) of the APOE call
+APOE_SCORE = {
+    (0, 2): 2.5,   # ε2/ε2
+    (0, 1): 1.5,   # ε2/ε3
+    (0, 0): 0,     # ε3/ε3
+    (1, 1): -0.5,  # ε2/ε4
+    (1, 0): -2.0,  # ε3/ε4
+    (2, 0): -4.0,  # ε4/ε4
+}
+
 # Anti-aging recommendations based on genotype patterns
 RECOMMENDATIONS = {
     "oxidative_stress": {
-        "risk": [
+        "risk": (
             "Increase antioxidant intake: Vitamin C (500-1000mg), Vitamin E (400 IU), CoQ10 (100-200mg)",
             "Consider NAC (N-Acetyl Cysteine) 600-1200mg/day for glutathione support",
             "Eat colorful vegetables rich in polyphenols",
             "Avoid excessive iron supplementation",
             "Consider astaxanthin supplementation (4-12mg/day)",
-        ],
-        "risk_ru": [
+        ),
+        "risk_ru": (
             "Увеличьте потребление антиоксидантов: Витамин C (500-1000мг), Витамин E (400 МЕ), CoQ10 (100-200мг)",
             "Рассмотрите NAC (N-ацетилцистеин) 600-1200мг/день для поддержки глутатиона",
             "Ешьте разноцветные овощи, богатые полифенолами",
             "Избегайте избыточного приёма железа",
             "Рассмотрите астаксантин (4-12мг/день)",
-        ],
+        ),
     },
     "inflammation": {
-        "risk": [
+        "risk": (
             "Follow anti-inflammatory diet (Mediterranean, low glycemic)",
             "Consider omega-3 fatty acids (EPA/DHA 2-4g/day)",
             "Curcumin with piperine (500-1000mg/day)",
             "Reduce refined carbohydrates and processed foods",
             "Regular moderate exercise (avoid overtraining)",
             "Optimize sleep (7-9 hours)",
-        ],
-        "risk_ru": [
+        ),
+        "risk_ru": (
             "Придерживайтесь противовоспалительной диеты (средиземноморская, низкогликемическая)",
             "Рассмотрите омега-3 жирные кислоты (EPA/DHA 2-4г/день)",
             "Куркумин с пиперином (500-1000мг/день)",
             "Сократите рафинированные углеводы и переработанные продукты",
             "Регулярные умеренные упражнения (избегайте перетренированности)",
             "Оптимизируйте сон (7-9 часов)",
-        ],
+        ),
     },
     "telomeres": {
-        "risk": [
+        "risk": (
             "Prioritize stress management (meditation, yoga)",
             "Ensure adequate sleep for telomere maintenance",
             "Consider TA-65 or astragalus root extract",
             "Regular moderate exercise",
             "Avoid excessive endurance training",
             "Optimize vitamin D levels (40-60 ng/mL)",
-        ],
-        "risk_ru": [
+        ),
+        "risk_ru": (
             "Приоритизируйте управление стрессом (медитация, йога)",
             "Обеспечьте достаточный сон для поддержания теломер",
             "Рассмотрите TA-65 или экстракт астрагала",
             "Регулярные умеренные упражнения",
             "Избегайте чрезмерных тренировок на выносливость",
             "Оптимизируйте уровень витамина D (40-60 нг/мл)",
-        ],
+        ),
     },
     "dna_repair": {
-        "risk": [
+        "risk": (
             "Ensure adequate B vitamins (especially B12, folate)",
             "Consider NMN or NR for NAD+ support (250-500mg/day)",
             "Minimize UV and radiation exposure",
             "Avoid DNA-damaging substances (tobacco, excessive alcohol)",
             "Consider sulforaphane from broccoli sprouts",
-        ],
-        "risk_ru": [
+        ),
+        "risk_ru": (
             "Обеспечьте достаточное потребление витаминов группы B (особенно B12, фолат)",
             "Рассмотрите NMN или NR для поддержки NAD+ (250-500мг/день)",
             "Минимизируйте воздействие УФ и радиации",
             "Избегайте веществ, повреждающих ДНК (табак, избыточный алкоголь)",
             "Рассмотрите сульфорафан из ростков брокколи",
-        ],
+        ),
     },
     "sirtuin": {
-        "baseline": [
+        "baseline": (
             "Practice intermittent fasting or time-restricted eating",
             "Consider resveratrol (250-500mg/day) or pterostilbene",
             "NMN or NR supplementation for NAD+ boost",
             "Regular exercise activates sirtuins",
             "Cold exposure (cold showers, cryotherapy)",
-        ],
-        "baseline_ru": [
+        ),
+        "baseline_ru": (
             "Практикуйте интервальное голодание или ограниченное по времени питание",
             "Рассмотрите ресвератрол (250-500мг/день) или птеростильбен",
             "Добавки NMN или NR для повышения NAD+",
             "Регулярные упражнения активируют сиртуины",
             "Холодовое воздействие (холодный душ, криотерапия)",
-        ],
+        ),
     },
     "apoe_e4": {
-        "risk": [
+        "risk": (
             "CRITICAL: Prioritize cardiovascular and brain health",
             "Follow strict Mediterranean or MIND diet",
             "Regular aerobic exercise (150+ min/week)",
@@ -381,8 +430,8 @@ RECOMMENDATIONS = {
             "Avoid head injuries",
             "Engage in cognitive activities and social connections",
             "Regular cardiovascular screening",
-        ],
-        "risk_ru": [
+        ),
+        "risk_ru": (
             "ВАЖНО: Приоритет здоровью сердца и мозга",
             "Строго следуйте средиземноморской или MIND диете",
             "Регулярные аэробные упражнения (150+ мин/неделю)",
@@ -392,9 +441,9 @@ RECOMMENDATIONS = {
             "Избегайте травм головы",
             "Занимайтесь когнитивной активностью и поддерживайте социальные связи",
             "Регулярный сердечно-сосудистый скрининг",
-        ],
+        ),
     },
-    "general_longevity": [
+    "general_longevity": (
         "Caloric restriction or intermittent fasting",
         "Regular exercise combining cardio and resistance training",
         "Optimize sleep quality and circadian rhythm",
@@ -403,8 +452,8 @@ RECOMMENDATIONS = {
         "Consider metformin or rapamycin (consult physician)",
         "Maintain healthy body weight",
         "Avoid smoking and limit alcohol",
-    ],
-    "general_longevity_ru": [
+    ),
+    "general_longevity_ru": (
         "Калорийное ограничение или интервальное голодание",
         "Регулярные упражнения, сочетающие кардио и силовые",
         "Оптимизируйте качество сна и циркадный ритм",
@@ -413,23 +462,81 @@ RECOMMENDATIONS = {
         "Рассмотрите метформин или рапамицин (консультация с врачом)",
         "Поддерживайте здоровый вес",
         "Избегайте курения и ограничьте алкоголь",
-    ],
+    ),
+}
+
+# (category, "risk" | "baseline") -> (items, items_ru) from RECOMMENDATIONS
+CATEGORY_TO_RECS = {
+    (category, level): (recs[level], recs[f"{level}_ru"])
+    for category, recs in RECOMMENDATIONS.items()
+    if isinstance(recs, dict)
+    for level in ("risk", "baseline")
+    if level in recs
 }
 
+# Sort rank of each recommendation priority, most urgent first
+PRIORITY_ORDER = {"high": 0, "moderate": 1, "low": 2}
+
 
 def load_genome():
-    """Load and parse 23andMe genome file"""
+    """Load (genome, snp_count), reusing the parsed copy cached by a previous run"""
+    cache_file = (f"{CACHE_PATH}/longevity_genome_v{GENOME_CACHE_VERSION}"
+                  f"_{genome_digest()}_{WANTED_DIGEST}.pickle")
+    try:
+        with open(cache_file, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+        pass  # no cache yet, or a damaged one: re-parse and rewrite it
+
+    parsed = parse_genome()
+    os.makedirs(CACHE_PATH, exist_ok=True)
+    # Unique temp file, so concurrent runs never write into the same one
+    fd, tmp_file = tempfile.mkstemp(dir=CACHE_PATH, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(parsed, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    return parsed
+
+
+def genome_digest():
+    """SHA-256 of the genome file contents, used as the cache key"""
+    digest = hashlib.sha256()
+    with open(GENOME_FILE, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def parse_genome():
+    """Parse the raw genome file into {rsid: genotype} for WANTED_RSIDS, plus the file's SNP count"""
     genome = {}
+    snp_count = 0
     with open(GENOME_FILE, 'r') as f:
         for line in f:
-            if line.startswith('#') or not line.strip():
+            if line[:1] == '#':
                 continue
-            parts = line.strip().split('\t')
+            parts = line.split('\t', 4)  # trailing columns are never read
             if len(parts) >= 4:
-                rsid = parts[0]
-                genotype = parts[3]
-                genome[rsid] = genotype
-    return genome
+                snp_count += 1
+                if parts[0] in WANTED_RSIDS:
+                    genome[parts[0]] = parts[3].rstrip()
+    return genome, snp_count
+
+
+# Sorted-allele form of every 2-letter genotype, so normalizing is one lookup
+_NORMALIZED = {a + b: "".join(sorted(a + b)) for a in "ACGTDI-" for b in "ACGTDI-"}
+
+
+def normalize_genotype(genotype):
+    """Normalize genotype for comparison (sort alleles)"""
+    normalized = _NORMALIZED.get(genotype)
+    if normalized is None:
+        normalized = "".join(sorted(genotype)) if len(genotype) == 2 else genotype
+    return normalized
 
 
 def determine_apoe_genotype(genome):
@@ -437,29 +544,19 @@ def determine_apoe_genotype(genome):
     Determine APOE genotype (ε2/ε2, ε2/ε3, ε3/ε3, ε2/ε4, ε3/ε4, ε4/ε4)
     Based on rs429358 and rs7412
     """
-    rs429358 = genome.get("rs429358", "")
-    rs7412 = genome.get("rs7412", "")
-
-    # Normalize genotypes (sort alleles)
-    def normalize(gt):
-        if len(gt) == 2:
-            return "".join(sorted(gt))
-        return gt
+    # Copy, so callers never modify the dict held by the cache
+    return dict(_apoe_call(normalize_genotype(genome.get("rs429358", "")),
+                           normalize_genotype(genome.get("rs7412", ""))))
 
-    rs429358 = normalize(rs429358)
-    rs7412 = normalize(rs7412)
 
+@lru_cache(maxsize=64)
+def _apoe_call(rs429358, rs7412):
+    """APOE call for a normalized genotype pair"""
     # Look up in table
-    key = (rs429358, rs7412)
+    call = APOE_GENOTYPES.get((rs429358, rs7412))
 
-    if key in APOE_GENOTYPES:
-        return {
-            "genotype": APOE_GENOTYPES[key][0],
-            "interpretation": APOE_GENOTYPES[key][1],
-            "interpretation_ru": APOE_GENOTYPES[key][2],
-            "rs429358": rs429358,
-            "rs7412": rs7412,
-        }
+    if call:
+        genotype, interpretation, interpretation_ru = call
     else:
         # Manual determination based on individual SNPs
         # rs429358: C=ε4, T=not ε4
@@ -482,78 +579,87 @@ def determine_apoe_genotype(genome):
         else:
             genotype = "Unknown"
 
-        return {
-            "genotype": genotype,
-            "interpretation": f"Determined from rs429358={rs429358}, rs7412={rs7412}",
-            "interpretation_ru": f"Определено из rs429358={rs429358}, rs7412={rs7412}",
-            "rs429358": rs429358,
-            "rs7412": rs7412,
+        interpretation = f"Determined from rs429358={rs429358}, rs7412={rs7412}"
+        interpretation_ru = f"Определено из rs429358={rs429358}, rs7412={rs7412}"
+
+    return {
+        "genotype": genotype,
+        "interpretation": interpretation,
+        "interpretation_ru": interpretation_ru,
+        "rs429358": rs429358,
+        "rs7412": rs7412,
+        # alleles in the call itself; "Unknown" counts as neither
+        "e4_count": genotype.count("ε4"),
+        "e2_count": genotype.count("ε2"),
+    }
+
+
+# Statuses tallied in each category summary, in report order
+SUMMARY_STATUSES = ("beneficial", "moderate", "baseline", "risk")
+
+
+def _analyze_one(rsid, genome):
+    """Interpret one longevity SNP against the genome"""
+    _, gene, description, description_ru, interpretations = SNP_INDEX[rsid]
+    genotype = genome.get(rsid, "")
+
+    if not genotype or genotype == "--":
+        interpretation = {
+            "status": "not_tested",
+            "description": "Not tested in this chip",
+            "description_ru": "Не тестировался на этом чипе",
+            "score": 0,
+        }
+    else:
+        interp = interpretations.get(genotype)
+        if interp is None:
+            interp = ("unknown", f"Genotype {genotype} not in database", f"Генотип {genotype} не в базе", 0)
+
+        status, interp_en, interp_ru, score = interp
+        interpretation = {
+            "status": status,
+            "description": interp_en,
+            "description_ru": interp_ru,
+            "score": score,
         }
 
+    return {
+        "gene": gene,
+        "description": description,
+        "description_ru": description_ru,
+        "genotype": genotype,
+        "interpretation": interpretation,
+    }
+
 
 def analyze_longevity(genome):
     """Analyze all longevity-related SNPs"""
     results = {}
 
-    for category, category_data in LONGEVITY_SNPS.items():
-        category_results = {
-            "name": category_data["name"],
-            "name_ru": category_data["name_ru"],
-            "snps": {},
-            "summary": {
-                "beneficial": 0,
-                "moderate": 0,
-                "baseline": 0,
-                "risk": 0,
-            }
+    for category, (name, name_ru, rsids) in CATEGORY_META.items():
+        snps = {rsid: _analyze_one(rsid, genome) for rsid in rsids}
+        counts = Counter(snp["interpretation"]["status"] for snp in snps.values())
+        results[category] = {
+            "name": name,
+            "name_ru": name_ru,
+            "snps": snps,
+            "summary": {status: counts[status] for status in SUMMARY_STATUSES},
         }
 
-        for rsid, snp_data in category_data["snps"].items():
-            genotype = genome.get(rsid, "")
-
-            if not genotype or genotype == "--":
-                interpretation = {
-                    "status": "not_tested",
-                    "description": "Not tested in this chip",
-                    "description_ru": "Не тестировался на этом чипе",
-                    "score": 0,
-                }
-            else:
-                # Normalize genotype
-                normalized = "".join(sorted(genotype)) if len(genotype) == 2 else genotype
-
-                # Try both original and normalized
-                if genotype in snp_data["interpretation"]:
-                    interp = snp_data["interpretation"][genotype]
-                elif normalized in snp_data["interpretation"]:
-                    interp = snp_data["interpretation"][normalized]
-                else:
-                    interp = ("unknown", f"Genotype {genotype} not in database", f"Генотип {genotype} не в базе", 0)
-
-                interpretation = {
-                    "status": interp[0],
-                    "description": interp[1],
-                    "description_ru": interp[2],
-                    "score": interp[3] if len(interp) > 3 else 0,
-                }
+    # Add APOE genotype determination
+    results["apoe_determination"] = determine_apoe_genotype(genome)
 
-                if interp[0] in category_results["summary"]:
-                    category_results["summary"][interp[0]] += 1
+    return results
 
-            category_results["snps"][rsid] = {
-                "gene": snp_data["gene"],
-                "description": snp_data["description"],
-                "description_ru": snp_data["description_ru"],
-                "genotype": genotype,
-                "interpretation": interpretation,
-            }
 
-        results[category] = category_results
+# Population score distribution for the percentile estimate (normal, mean 0, std dev ~5)
+SCORE_MEAN = 0
+SCORE_ERF_SCALE = 5 * math.sqrt(2)
 
-    # Add APOE genotype determination
-    results["apoe_determination"] = determine_apoe_genotype(genome)
 
-    return results
+def score_percentile(score):
+    """Rough percentile of a longevity score under the normal population model"""
+    return 50 * (1 + math.erf((score - SCORE_MEAN) / SCORE_ERF_SCALE))
 
 
 def calculate_longevity_score(results):
@@ -564,21 +670,7 @@ def calculate_longevity_score(results):
     for category, data in results.items():
         if category == "apoe_determination":
             # Add APOE-specific scoring
-            apoe = data["genotype"]
-            if "ε2/ε2" in apoe:
-                apoe_score = 2.5
-            elif "ε2/ε3" in apoe:
-                apoe_score = 1.5
-            elif "ε3/ε3" in apoe:
-                apoe_score = 0
-            elif "ε2/ε4" in apoe:
-                apoe_score = -0.5
-            elif "ε3/ε4" in apoe:
-                apoe_score = -2.0
-            elif "ε4/ε4" in apoe:
-                apoe_score = -4.0
-            else:
-                apoe_score = 0
+            apoe_score = APOE_SCORE.get((data["e4_count"], data["e2_count"]), 0)
             scores_by_category["apoe"] = apoe_score
             total_score += apoe_score
             continue
@@ -597,14 +689,7 @@ def calculate_longevity_score(results):
         scores_by_category[category] = category_score
         total_score += category_score
 
-    # Calculate percentile (rough estimate based on normal distribution)
-    # Assuming average score is 0, std dev ~5
-    import math
-
-    def normal_cdf(x, mean=0, std=5):
-        return 0.5 * (1 + math.erf((x - mean) / (std * math.sqrt(2))))
-
-    percentile = normal_cdf(total_score) * 100
+    percentile = score_percentile(total_score)
 
     return {
         "total_score": total_score,
@@ -650,62 +735,49 @@ def get_score_interpretation(score, percentile):
 
 def get_recommendations(results, score_data):
     """Generate personalized anti-aging recommendations"""
-    recommendations = []
+    ranked = []  # (priority rank, recommendation), sorted stably at the end
+
+    def add(category, category_ru, priority, recs):
+        items, items_ru = recs
+        ranked.append((PRIORITY_ORDER[priority], {
+            "category": category,
+            "category_ru": category_ru,
+            "priority": priority,
+            "items": items,
+            "items_ru": items_ru,
+        }))
 
     # Check each category for risk factors
     for category, data in results.items():
         if category == "apoe_determination":
             # APOE-specific recommendations
-            if "ε4" in data["genotype"]:
-                recommendations.append({
-                    "category": "APOE ε4 Carrier",
-                    "category_ru": "Носитель APOE ε4",
-                    "priority": "high",
-                    "items": RECOMMENDATIONS["apoe_e4"]["risk"],
-                    "items_ru": RECOMMENDATIONS["apoe_e4"]["risk_ru"],
-                })
+            if data["e4_count"]:
+                add("APOE ε4 Carrier", "Носитель APOE ε4", "high", CATEGORY_TO_RECS[("apoe_e4", "risk")])
             continue
 
         if "snps" not in data:
             continue
 
-        # Count risks in category
+        # Risk recommendations if the category has risk findings, otherwise its baseline ones
         risk_count = data["summary"].get("risk", 0)
-
-        if risk_count > 0 and category in RECOMMENDATIONS:
-            cat_recs = RECOMMENDATIONS[category]
-            if "risk" in cat_recs:
-                recommendations.append({
-                    "category": data["name"],
-                    "category_ru": data["name_ru"],
-                    "priority": "high" if risk_count > 1 else "moderate",
-                    "items": cat_recs["risk"],
-                    "items_ru": cat_recs["risk_ru"],
-                })
-        elif category in RECOMMENDATIONS and "baseline" in RECOMMENDATIONS[category]:
-            # Add baseline recommendations for categories without risk
-            recommendations.append({
-                "category": data["name"],
-                "category_ru": data["name_ru"],
-                "priority": "low",
-                "items": RECOMMENDATIONS[category]["baseline"],
-                "items_ru": RECOMMENDATIONS[category]["baseline_ru"],
-            })
+        recs = CATEGORY_TO_RECS.get((category, "risk" if risk_count > 0 else "baseline"))
+        if recs:
+            if risk_count > 0:
+                priority = "high" if risk_count > 1 else "moderate"
+            else:
+                priority = "low"
+            add(data["name"], data["name_ru"], priority, recs)
 
     # Always add general longevity recommendations
-    recommendations.append({
-        "category": "General Longevity",
-        "category_ru": "Общее долголетие",
-        "priority": "moderate",
-        "items": RECOMMENDATIONS["general_longevity"],
-        "items_ru": RECOMMENDATIONS["general_longevity_ru"],
-    })
+    add("General Longevity", "Общее долголетие", "moderate",
+        (RECOMMENDATIONS["general_longevity"], RECOMMENDATIONS["general_longevity_ru"]))
 
     # Sort by priority
-    priority_order = {"high": 0, "moderate": 1, "low": 2}
-    recommendations.sort(key=lambda x: priority_order.get(x["priority"], 3))
+    ranked.sort(key=itemgetter(0))
+    return [rec for _, rec in ranked]
 
-    return recommendations
+
+_STATUS_ICON = {"beneficial": "✅", "moderate": "➖", "baseline": "⚪", "risk": "⚠️"}
 
 
 def generate_report(results, score_data, recommendations):
@@ -744,10 +816,10 @@ def generate_report(results, score_data, recommendations):
     report.append(f"- rs429358: {apoe['rs429358']}")
     report.append(f"- rs7412: {apoe['rs7412']}\n")
 
-    if "ε4" in apoe["genotype"]:
+    if apoe["e4_count"]:
         report.append("⚠️ **WARNING / ВНИМАНИЕ:** APOE ε4 carrier detected. See recommendations section.\n")
         report.append("⚠️ **ВНИМАНИЕ:** Обнаружен носитель APOE ε4. См. раздел рекомендаций.\n")
-    elif "ε2" in apoe["genotype"]:
+    elif apoe["e2_count"]:
         report.append("✅ **FAVORABLE / БЛАГОПРИЯТНО:** APOE ε2 allele detected - protective against Alzheimer's.\n")
         report.append("✅ **БЛАГОПРИЯТНО:** Обнаружен аллель APOE ε2 - защита от болезни Альцгеймера.\n")
 
@@ -764,13 +836,11 @@ def generate_report(results, score_data, recommendations):
         report.append(f"### {data['name']} / {data['name_ru']}\n")
 
         # Summary counts
-        summary = data["summary"]
-        status_icons = {"beneficial": "✅", "moderate": "➖", "baseline": "⚪", "risk": "⚠️"}
-        summary_parts = []
-        for status, count in summary.items():
-            if count > 0:
-                icon = status_icons.get(status, "")
-                summary_parts.append(f"{icon} {status.title()}: {count}")
+        summary_parts = [
+            f"{_STATUS_ICON.get(status, '')} {status.title()}: {count}"
+            for status, count in data["summary"].items()
+            if count > 0
+        ]
         if summary_parts:
             report.append(f"**Summary:** {' | '.join(summary_parts)}\n")
 
@@ -784,7 +854,7 @@ def generate_report(results, score_data, recommendations):
             status = snp_data["interpretation"]["status"]
             desc_ru = snp_data["interpretation"]["description_ru"]
 
-            status_icon = status_icons.get(status, "")
+            status_icon = _STATUS_ICON.get(status, "")
             report.append(f"| {rsid} | {gene} | {genotype} | {status_icon} {status} | {desc_ru} |")
 
         report.append("")
@@ -825,6 +895,12 @@ factors play significant roles. Consult healthcare professionals before making h
     return "\n".join(report)
 
 
+def write_report(path, text):
+    """Write a report as UTF-8 with a single write() call"""
+    with open(path, 'wb') as f:
+        f.write(text.encode('utf-8'))
+
+
 def main():
     """Main execution function"""
     print("=" * 60)
@@ -835,8 +911,8 @@ def main():
 
     # Load genome
     print("Loading genome data...")
-    genome = load_genome()
-    print(f"Loaded {len(genome):,} SNPs from genome file.\n")
+    genome, snp_count = load_genome()
+    print(f"Loaded {snp_count:,} SNPs from genome file.\n")
 
     # Analyze longevity SNPs
     print("Analyzing longevity markers...")
@@ -859,8 +935,7 @@ def main():
     os.makedirs(report_dir, exist_ok=True)
     report_file = f"{report_dir}/report.md"
 
-    with open(report_file, 'w', encoding='utf-8') as f:
-        f.write(report)
+    write_report(report_file, report)
 
     print(f"\nReport saved to: {report_file}")
 